@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+
+# Árvore podada pelos dois caminhos: parser concreto (tppparser) + poda
+# (tppsema.pruneDeclaration) e parser que monta a árvore podada direto
+# (tppast). Mostra o tempo e quantos nós foram alocados em cada caminho.
+#
+# Uso: python benchmarks/bench_ast.py [linhas ...]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+import mytree
+import tppparser
+import tppsema
+from myerror import diagnostics
+
+
+def allocated():
+    # Próximo número da sequência de ids = nós criados desde o reset.
+    return next(mytree.node_sequence.get())
+
+
+def concrete(source):
+    start = time.perf_counter()
+    tree = tppparser.parse(source)
+    tppsema.pruneDeclaration(tree)
+    return time.perf_counter() - start, allocated()
+
+
+def direct(source):
+    start = time.perf_counter()
+    tppparser.parse(source, direct=True)
+    return time.perf_counter() - start, allocated()
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [6250, 12500, 25000, 50000]
+
+    # As mensagens do programa sintético não interessam aqui.
+    diagnostics.set([])
+    # Tabelas carregadas fora da medição.
+    tppparser.parse(synthetic.program(10))
+    tppparser.parse(synthetic.program(10), direct=True)
+
+    print('%10s %14s %14s %12s %12s' % ('linhas', 'poda (ms)', 'direta (ms)', 'nós poda', 'nós direta'))
+    for lines in sizes:
+        source = synthetic.program(lines)
+        lines = source.count('\n')
+        pruned, pruned_nodes = concrete(source)
+        built, built_nodes = direct(source)
+        print('%10d %14.1f %14.1f %12d %12d' % (lines, pruned * 1000, built * 1000, pruned_nodes, built_nodes))
+
+
+if __name__ == '__main__':
+    main()
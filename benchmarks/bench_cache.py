@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+import tempfile
+
+# Compilação com a cache das árvores podadas (tppcompiler.load_tree): sem
+# cache, na primeira compilação (análise + gravação da entrada) e nas
+# seguintes (árvore lida da cache, só a geração de código).
+#
+# Uso: python benchmarks/bench_cache.py [linhas ...]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+from tppcompiler import Compilation
+
+def compile(source, cache):
+    start = time.perf_counter()
+    Compilation(source, cache=cache).run()
+    return time.perf_counter() - start
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 5000, 20000]
+    os.environ['TPP_CACHE_DIR'] = tempfile.mkdtemp()
+    compile(synthetic.gencode_program(10), False)
+
+    print('%10s %14s %14s %14s %12s' % ('linhas', 'sem cache (ms)', '1ª (ms)', 'seguinte (ms)', 'entrada (KB)'))
+    for lines in sizes:
+        source = synthetic.gencode_program(lines)
+        plain = compile(source, False)
+        first = compile(source, True)
+        cached = min(compile(source, True) for i in range(3))
+        directory = os.path.join(os.environ['TPP_CACHE_DIR'], 'v1', 'ast')
+        size = max(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print('%10d %14.1f %14.1f %14.1f %12.1f' % (lines, plain * 1000, first * 1000, cached * 1000, size / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+
+# Colunas das mensagens de erro em entradas com muitos erros na mesma linha:
+# tempo da análise sintática completa e só do cálculo das colunas, procurando
+# o '\n' anterior a cada token (rfind) e pelo índice de linhas
+# (tpplex.LineIndex).
+#
+# Uso: python benchmarks/bench_errors.py [erros ...]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tpplex
+import tppparser
+from myerror import diagnostics
+
+STATEMENT = 'x := * 1 y := 2 '
+
+
+def source(errors):
+    # Uma função com todos os comandos na mesma linha; cada comando tem um
+    # erro de sintaxe (dois operadores seguidos).
+    return 'inteiro principal()\n  ' + STATEMENT * errors + '\nfim\n'
+
+
+def rfind(data, positions):
+    start = time.perf_counter()
+    for lexpos in positions:
+        (lexpos - (data.rfind('\n', 0, lexpos) + 1)) + 1
+    return time.perf_counter() - start
+
+
+def indexed(data, positions):
+    start = time.perf_counter()
+    index = tpplex.LineIndex(data)
+    for lexpos in positions:
+        index.column(lexpos)
+    return time.perf_counter() - start
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [2500, 5000, 10000, 20000, 40000]
+
+    print('%10s %12s %14s %14s' % ('erros', 'parse (ms)', 'rfind (ms)', 'índice (ms)'))
+    for errors in sizes:
+        data = source(errors)
+        messages = []
+        token = diagnostics.set(messages)
+        start = time.perf_counter()
+        tppparser.parse(data)
+        elapsed = time.perf_counter() - start
+        diagnostics.reset(token)
+        # Posição de cada '*' que gerou uma mensagem.
+        first = data.index('*')
+        positions = range(first, first + errors * len(STATEMENT), len(STATEMENT))
+        print('%10d %12.1f %14.1f %14.1f' % (errors, elapsed * 1000,
+              rfind(data, positions) * 1000, indexed(data, positions) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+
+# Custo de construir um GenCode: com a inicialização do LLVM e a criação da
+# target machine a cada instância (como o construtor fazia) e com a target
+# machine do processo (getTargetMachine), reaproveitada.
+#
+# Uso: python benchmarks/bench_gencode_init.py [instancias]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from llvmlite import binding as llvm
+from tppgencode import GenCode, getTargetMachine
+
+
+def fresh_machine():
+    # O que o construtor executava a cada instância.
+    llvm.initialize()
+    llvm.initialize_all_targets()
+    llvm.initialize_native_target()
+    llvm.initialize_native_asmprinter()
+    target = llvm.Target.from_triple(llvm.get_process_triple())
+    return target.create_target_machine()
+
+
+def measure(count, machine):
+    start = time.perf_counter()
+    for i in range(count):
+        GenCode(target_machine=machine())
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    getTargetMachine()
+
+    fresh = measure(count, fresh_machine)
+    cached = measure(count, getTargetMachine)
+
+    print('GenCode() (%d instâncias)' % count)
+    print('  target machine nova:        %8.1fus' % (fresh * 1e6))
+    print('  target machine do processo: %8.1fus' % (cached * 1e6))
+    print('  speedup: %.1fx' % (fresh / cached))
+
+
+if __name__ == "__main__":
+    main()
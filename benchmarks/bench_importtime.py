@@ -0,0 +1,41 @@
+import os
+import sys
+import subprocess
+
+# Relatório de tempo de importação (python -X importtime) dos módulos do
+# compilador. O resultado de referência está em benchmarks/importtime.txt.
+#
+# Uso: python benchmarks/bench_importtime.py [repeticoes]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['myerror', 'mytree', 'tpplex', 'tppparser', 'tppsema', 'tppgencode', 'main']
+
+
+def import_time(module):
+    # Tempo acumulado (em microssegundos) da importação do módulo.
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                             cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                             universal_newlines=True, check=True)
+    for line in process.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module and not fields[2].startswith('  '):
+            return int(fields[1])
+    return None
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    # Uma execução para aquecer a cache de bytecode e de tabelas do parser.
+    for module in MODULES:
+        import_time(module)
+
+    print('%-12s %12s' % ('módulo', 'import (ms)'))
+    for module in MODULES:
+        best = min(import_time(module) for i in range(runs))
+        print('%-12s %12.1f' % (module, best / 1000))
+
+
+if __name__ == "__main__":
+    main()
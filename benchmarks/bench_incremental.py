@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import tempfile
+
+# Geração de código incremental (GenCode(incremental=True)): tempo da
+# geração de todas as funções e, depois de alterar uma das funções, da
+# geração que reaproveita o IR das outras da cache. A árvore podada também
+# vem da cache quando o código não mudou.
+#
+# Uso: python benchmarks/bench_incremental.py [linhas ...]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+from tppcompiler import Compilation
+
+
+def compile(source, incremental):
+    start = time.perf_counter()
+    compilation = Compilation(source, cache=True, incremental=incremental)
+    compilation.parse()
+    compilation.prune()
+    middle = time.perf_counter()
+    compilation.generate()
+    end = time.perf_counter()
+    return middle - start, end - middle
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 5000, 20000]
+    os.environ['TPP_CACHE_DIR'] = tempfile.mkdtemp()
+    compile(synthetic.gencode_program(10), False)
+
+    print('%10s %10s %16s %16s %18s' % ('linhas', 'funções', 'análise (ms)', 'geração (ms)',
+                                       'geração incr. (ms)'))
+    for lines in sizes:
+        functions = lines // synthetic.GENCODE_FUNCTION.count('\n')
+        compile(synthetic.gencode_program(lines), True)
+        # Uma função alterada: a análise é refeita, a geração só dessa função.
+        edited = synthetic.gencode_program(lines, edited=functions // 2)
+        analysis, full = compile(edited, False)
+        analysis, incremental = compile(edited, True)
+        print('%10d %10d %16.1f %16.1f %18.1f' % (lines, functions, analysis * 1000, full * 1000,
+                                                 incremental * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import tracemalloc
+
+# Nomes das folhas da árvore podada (ids, números, símbolos): quantos objetos
+# str distintos existem para os valores repetidos, a memória desses objetos
+# e a memória da árvore inteira.
+#
+# Uso: python benchmarks/bench_intern.py [linhas ...]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+import tppparser
+from myerror import diagnostics
+
+
+def leaves(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        children = node.children
+        if children:
+            stack.extend(children)
+        elif isinstance(node.name, str):
+            yield node.name
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [25000, 50000, 100000]
+
+    diagnostics.set([])
+    tppparser.parse(synthetic.program(10), direct=True)
+
+    print('%10s %10s %12s %12s %14s %12s' % ('linhas', 'folhas', 'str objetos', 'str valores',
+                                           'str (MB)', 'árvore (MB)'))
+    for lines in sizes:
+        source = synthetic.program(lines)
+        tracemalloc.start()
+        root = tppparser.parse(source, direct=True)
+        tree = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        names = list(leaves(root))
+        objects = {id(name): name for name in names}
+        size = sum(sys.getsizeof(name) for name in objects.values())
+        print('%10d %10d %12d %12d %14.1f %12.1f' % (lines, len(names), len(objects), len(set(names)),
+                                                    size / 2 ** 20, tree / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
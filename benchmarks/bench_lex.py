@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+
+# Vazão dos lexers (tokens/s e MB/s) em um programa sintético de vários MB,
+# com comentários, e o tempo de um comentário sem fechamento: ply.lex
+# (tpplex) e o scanner de uma única expressão regular (tppscan).
+#
+# Uso: python benchmarks/bench_lex.py [MB] [repeticoes]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+import tpplex
+from myerror import diagnostics
+
+
+def tokenize(kind, source):
+    lexer = tpplex.new_lexer(kind)
+    lexer.input(source)
+    count = 0
+    start = time.perf_counter()
+    while lexer.token():
+        count += 1
+    return count, time.perf_counter() - start
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    # As mensagens de caracteres inválidos não interessam aqui.
+    diagnostics.set([])
+
+    lines = int(megabytes * 1024 * 1024 / 16)
+    source = synthetic.program(lines, comments=True)
+    size = len(source.encode()) / (1024 * 1024)
+
+    # Um '{' sem '}' é tentado como comentário até o fim da entrada.
+    unterminated = '{ ' + 'x := x + 1\n' * 20000
+
+    for name in tpplex.LEXERS:
+        count, elapsed = min((tokenize(name, source) for i in range(runs)), key=lambda result: result[1])
+        print('%-6s %.1f MB, %d tokens: %.1f ms, %.0f tokens/s, %.2f MB/s' % (
+            name, size, count, elapsed * 1000, count / elapsed, size / elapsed))
+        count, elapsed = tokenize(name, unterminated)
+        print('%-6s comentário sem fechamento (%d KB): %.1f ms' % (name, len(unterminated) // 1024, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
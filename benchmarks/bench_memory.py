@@ -0,0 +1,71 @@
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+# Memória ocupada pela árvore sintática (bytes por nó) de um programa
+# sintético grande, medida com tracemalloc, com nós objeto (MyNode) e na
+# forma achatada (tppflat). A forma achatada é montada a partir da árvore de
+# objetos: ela reduz a memória retida depois do parse, não o pico, que é
+# mostrado à parte.
+#
+# Uso: python benchmarks/bench_memory.py [linhas]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+import tppparser
+import tppflat
+from myerror import diagnostics
+
+
+def count_nodes(tree):
+    count = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    source = synthetic.program(lines)
+    diagnostics.set([])
+
+    # Carrega lexer e tabelas antes de medir.
+    tppparser.parse('inteiro principal()\nfim\n')
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    tree = tppparser.parse(source)
+    elapsed = time.perf_counter() - start
+    size, peak = tracemalloc.get_traced_memory()
+    size -= before
+    nodes = count_nodes(tree)
+
+    # Depois de achatar, só a FlatTree (e a tabela de strings) fica viva.
+    flat = tppflat.FlatTree.from_tree(tree)
+    tree = tppparser.root = None
+    gc.collect()
+    flat_size, flat_peak = tracemalloc.get_traced_memory()
+    flat_size -= before
+    tracemalloc.stop()
+    del flat
+
+    print('linhas:           %d' % source.count('\n'))
+    print('nós:              %d' % nodes)
+    print('parse:            %.2fs (com tracemalloc)' % elapsed)
+    print('pico:             %.1f MB (parse), %.1f MB (parse e flat)' %
+          ((peak - before) / 1024 / 1024, (flat_peak - before) / 1024 / 1024))
+    print('%-8s %12s %14s' % ('árvore', 'retida (MB)', 'bytes por nó'))
+    print('%-8s %12.1f %14.1f' % ('MyNode', size / 1024 / 1024, size / nodes))
+    print('%-8s %12.1f %14.1f' % ('flat', flat_size / 1024 / 1024, flat_size / nodes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+# Leitura do código para o scanner (tppscan): o arquivo inteiro lido e
+# decodificado em um str, ou mapeado na memória e analisado como bytes
+# (tpplex.map_file). Mostra o tempo até o primeiro token, o tempo total e o
+# pico de memória alocada pelo Python (as páginas do arquivo mapeado são do
+# cache do sistema e não entram na conta).
+#
+# Uso: python benchmarks/bench_mmap.py [linhas ...]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+import tpplex
+
+
+def read(path):
+    file = open(path)
+    data = file.read()
+    file.close()
+    return data
+
+
+def measure(load, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    lexer = tpplex.new_lexer('regex')
+    lexer.input(load(path))
+    lexer.token()
+    first = time.perf_counter() - start
+    for tok in iter(lexer.token, None):
+        pass
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, elapsed, peak
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100000, 400000, 1600000]
+    tpplex.new_lexer('regex').input('')
+
+    print('%10s %8s %-6s %18s %12s %10s' % ('linhas', 'MB', 'modo', '1º token (ms)', 'total (ms)', 'pico (MB)'))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'programa.tpp')
+        for lines in sizes:
+            with open(path, 'w') as file:
+                file.write(synthetic.program(lines, comments=True))
+            size = os.path.getsize(path) / 2 ** 20
+            for mode, load in (('str', read), ('mmap', tpplex.map_file)):
+                first, elapsed, peak = measure(load, path)
+                print('%10d %8.1f %-6s %18.2f %12.1f %10.1f' % (lines, size, mode, first * 1000,
+                                                               elapsed * 1000, peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import glob
+import time
+import shutil
+import tempfile
+import subprocess
+
+# Tempo de execução dos programas tests/gencode-*.tpp compilados com -O0 a
+# -O3: o IR otimizado (tppgencode.optimize) vira um objeto
+# (tppgencode.emitObject), ligado com config/io.o pelo cc. Cada programa lê
+# da entrada padrão o mesmo número em todas as leituras.
+#
+# Uso: python benchmarks/bench_opt.py [entrada] [repeticoes]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from myerror import diagnostics
+from tppcompiler import Compilation
+from tppgencode import OPT_LEVELS, emitObject
+
+TIMEOUT = 30
+
+
+def build(path, opt, directory):
+    # Executável do programa no nível opt, ou None se não compila.
+    name = os.path.join(directory, '%s-O%d' % (os.path.basename(path)[:-4], opt))
+    try:
+        code = Compilation.from_file(path, opt=opt).run()
+        if code is None or not emitObject(code, name + '.o', opt):
+            return None
+    except Exception:
+        # Erro na geração do código.
+        return None
+    subprocess.run(['cc', '-no-pie', name + '.o', os.path.join(ROOT, 'config', 'io.o'), '-o', name], check=True)
+    return name
+
+
+def execute(program, data, runs):
+    # Menor tempo entre as execuções, ou None se alguma passou de TIMEOUT.
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        try:
+            subprocess.run([program], input=data, stdout=subprocess.DEVNULL, timeout=TIMEOUT)
+        except subprocess.TimeoutExpired:
+            return None
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    value = sys.argv[1] if len(sys.argv) > 1 else '30'
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    data = ((value + '\n') * 1000).encode()
+    os.chdir(ROOT)
+    # As mensagens dos programas não interessam aqui.
+    diagnostics.set([])
+    directory = tempfile.mkdtemp(prefix='tpp-opt-')
+
+    print('%-22s' % 'arquivo' + ''.join('%12s' % ('-O%d (ms)' % opt) for opt in OPT_LEVELS) + '%10s' % 'speedup')
+    try:
+        for path in sorted(glob.glob(os.path.join('tests', 'gencode-*.tpp'))):
+            times = []
+            for opt in OPT_LEVELS:
+                program = build(path, opt, directory)
+                times.append(execute(program, data, runs) if program else None)
+            if None in times:
+                print('%-22s %s' % (path, 'não compila ou não termina'))
+                continue
+            print('%-22s' % path + ''.join('%12.1f' % (elapsed * 1000) for elapsed in times) +
+                  '%9.1fx' % (times[0] / times[-1]))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
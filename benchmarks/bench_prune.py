@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+
+# Tempo da poda (tppsema.pruneDeclaration) de uma função cujo corpo tem
+# muitos comandos. Com a poda linear o tempo por mil comandos se mantém
+# constante.
+#
+# Uso: python benchmarks/bench_prune.py [comandos ...]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+import tppparser
+import tppsema
+from myerror import diagnostics
+
+
+def prune(source):
+    tree = tppparser.parse(source)
+    start = time.perf_counter()
+    tppsema.pruneDeclaration(tree)
+    return time.perf_counter() - start
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [12500, 25000, 50000, 100000]
+
+    # As mensagens do programa sintético não interessam aqui.
+    diagnostics.set([])
+
+    print('%10s %12s %18s' % ('comandos', 'poda (ms)', 'ms / mil comandos'))
+    for statements in sizes:
+        elapsed = prune(synthetic.body(statements))
+        print('%10d %12.1f %18.2f' % (statements, elapsed * 1000, elapsed * 1000000 / statements))
+
+
+if __name__ == '__main__':
+    main()
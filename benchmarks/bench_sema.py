@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+# Tempo da análise semântica (tppsema.checkRules) em programas sintéticos de
+# tamanho crescente. Com a análise linear o tempo por mil linhas se mantém
+# constante.
+#
+# Uso: python benchmarks/bench_sema.py [linhas ...]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+import tppparser
+import tppsema
+from myerror import diagnostics
+
+
+def check(source):
+    tree = tppparser.parse(source)
+    tppsema.reset(tree)
+    start = time.perf_counter()
+    tppsema.checkRules(tree)
+    return time.perf_counter() - start
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [6250, 12500, 25000, 50000]
+
+    # As mensagens do programa sintético não interessam aqui.
+    diagnostics.set([])
+
+    print('%10s %12s %16s' % ('linhas', 'sema (ms)', 'ms / mil linhas'))
+    for lines in sizes:
+        source = synthetic.program(lines)
+        lines = source.count('\n')
+        elapsed = check(source)
+        print('%10d %12.1f %16.2f' % (lines, elapsed * 1000, elapsed * 1000000 / lines))
+
+
+if __name__ == "__main__":
+    main()
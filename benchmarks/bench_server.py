@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+
+# Latência de compilar um arquivo: um processo `python main.py` por arquivo
+# contra uma requisição ao servidor de compilação (tppserver), que já tem o
+# lexer, o parser e o LLVM carregados.
+#
+# Uso: python benchmarks/bench_server.py [repeticoes]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tppserver
+
+SOURCE = os.path.join(ROOT, 'tests', 'gencode-014.tpp')
+
+
+def run_process(env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'main.py', '--no-cache', SOURCE], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def run_request(path):
+    start = time.perf_counter()
+    response = tppserver.remote({'path': SOURCE}, path)
+    assert response['status'] == 'ok', response['status']
+    return time.perf_counter() - start
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    os.chdir(ROOT)
+    cache = tempfile.mkdtemp(prefix='tpp-cache-')
+    env = dict(os.environ, TPP_CACHE_DIR=cache)
+    path = os.path.join(cache, 'tpp.sock')
+
+    server = tppserver.Server(path)
+    ready = threading.Event()
+    thread = threading.Thread(target=server.run, args=(ready,))
+    thread.start()
+    try:
+        ready.wait()
+        # Tabelas do parser na cache para os dois lados.
+        run_process(env)
+        processes = [run_process(env) for i in range(runs)]
+        requests = [run_request(path) for i in range(runs)]
+    finally:
+        tppserver.remote({'op': 'shutdown'}, path)
+        thread.join()
+        shutil.rmtree(cache, ignore_errors=True)
+
+    print('%s (%d execuções)' % (os.path.relpath(SOURCE, ROOT), runs))
+    print('  processo: min %.1fms  média %.1fms' % (min(processes) * 1000, sum(processes) / runs * 1000))
+    print('  servidor: min %.1fms  média %.1fms' % (min(requests) * 1000, sum(requests) / runs * 1000))
+    print('  speedup: %.1fx' % (min(processes) / min(requests)))
+
+
+if __name__ == "__main__":
+    main()
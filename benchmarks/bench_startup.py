@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+# Mede o tempo de inicialização do parser (import tppparser e
+# get_parser(), que carrega ou gera as tabelas LALR) com a cache de tabelas
+# vazia (cold) e já preenchida (warm).
+#
+# Uso: python benchmarks/bench_startup.py [repeticoes]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_import(env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import tppparser; tppparser.get_parser()'], cwd=ROOT, env=env, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    cache = tempfile.mkdtemp(prefix='tpp-cache-')
+    env = dict(os.environ, TPP_CACHE_DIR=cache)
+
+    try:
+        cold = []
+        for i in range(runs):
+            shutil.rmtree(cache)
+            os.makedirs(cache)
+            cold.append(run_import(env))
+
+        warm = [run_import(env) for i in range(runs)]
+    finally:
+        shutil.rmtree(cache, ignore_errors=True)
+
+    print('import tppparser; tppparser.get_parser() (%d execuções)' % runs)
+    print('  cold: min %.3fs  média %.3fs' % (min(cold), sum(cold) / runs))
+    print('  warm: min %.3fs  média %.3fs' % (min(warm), sum(warm) / runs))
+    print('  speedup: %.1fx' % (min(cold) / min(warm)))
+
+
+if __name__ == "__main__":
+    main()
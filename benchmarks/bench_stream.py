@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+# Dump de tokens de um arquivo grande: lendo o arquivo inteiro e montando a
+# saída em uma string (como o tpplex.test fazia) e lendo em pedaços com a
+# saída em um arquivo com buffer (tpplex.dump_tokens). Mostra o tempo e o
+# pico de memória alocada em cada caso.
+#
+# Uso: python benchmarks/bench_stream.py [linhas ...]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+import tpplex
+
+
+def whole(path):
+    lexer = tpplex.new_lexer()
+    lexer.input(open(path).read())
+    s = ''
+    for tok in iter(lexer.token, None):
+        s += str(tok.type) + '\n'
+    return len(s)
+
+
+def streamed(path):
+    output = open(os.devnull, 'w', buffering=1 << 20)
+    tpplex.dump_tokens(path, output)
+    output.close()
+
+
+def measure(function, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(path)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [25000, 50000, 100000, 200000]
+    tpplex.get_lexer()
+
+    print('%10s %10s %14s %14s %14s %14s' % ('linhas', 'MB', 'inteiro (ms)', 'inteiro (MB)',
+                                           'pedaços (ms)', 'pedaços (MB)'))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'programa.tpp')
+        for lines in sizes:
+            source = synthetic.program(lines, comments=True)
+            with open(path, 'w') as file:
+                file.write(source)
+            size = os.path.getsize(path) / 2 ** 20
+            del source
+            old, old_peak = measure(whole, path)
+            new, new_peak = measure(streamed, path)
+            print('%10d %10.1f %14.1f %14.1f %14.1f %14.1f' % (lines, size, old * 1000, old_peak / 2 ** 20,
+                                                               new * 1000, new_peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# Gera programas TPP sintéticos, válidos e de tamanho controlado, para os
+# benchmarks. Cada função tem declarações, atribuições, se, repita, leia,
+# escreva, chamadas e retorno.
+
+FUNCTION = '''inteiro f{k}(inteiro: a, flutuante: b)
+  inteiro: x, y
+  flutuante: z
+  x := a + 1
+  y := x * 2 - a
+  z := b
+  leia(y)
+  se x > y então
+    x := x - y
+  senão
+    y := y + g
+  fim
+  repita
+    x := x + 1
+  até x > 10
+  h[x] := z
+  escreva(z)
+  y := {call}
+  retorna(x + y)
+fim
+
+'''
+
+MAIN = '''inteiro principal()
+  inteiro: r
+  r := f{k}(1, 2.0)
+  escreva(r)
+  retorna(0)
+fim
+'''
+
+HEADER = 'inteiro: g\nflutuante: h[10]\n\n'
+
+
+COMMENT = '''{ Função f{k}: soma, compara e
+  chama a função anterior. }
+'''
+
+
+def program(lines, comments=False):
+    # Programa com aproximadamente 'lines' linhas (com comentários { ... }
+    # antes de cada função, se comments=True).
+    size = FUNCTION.count('\n')
+    functions = max(1, lines // size)
+    parts = [HEADER]
+    for k in range(functions):
+        call = 'f%d(x, z)' % (k - 1) if k > 0 else 'x + 1'
+        if comments:
+            parts.append(COMMENT.replace('{k}', str(k)))
+        parts.append(FUNCTION.replace('{k}', str(k)).replace('{call}', call))
+    parts.append(MAIN.replace('{k}', str(functions - 1)))
+    return ''.join(parts)
+
+
+STATEMENTS = [
+    '  x := x + 1\n',
+    '  escreva(x)\n',
+    '  se x > 10 então\n    x := 0\n  fim\n',
+    '  v[x] := x * 2\n',
+]
+
+
+def body(statements):
+    # Programa com uma única função cujo corpo tem 'statements' comandos.
+    parts = ['inteiro principal()\n  inteiro: x\n  inteiro: v[10]\n  x := 0\n']
+    for k in range(statements):
+        parts.append(STATEMENTS[k % len(STATEMENTS)])
+    parts.append('  retorna(x)\nfim\n')
+    return ''.join(parts)
+
+
+# Função aceita pela geração de código (program() mistura tipos nas
+# atribuições, o que só serve até a poda). {k} é o número da função.
+GENCODE_FUNCTION = '''inteiro f{k}(inteiro: a)
+  inteiro: x
+  x := a + {k}
+  se x > 10 então
+    x := x - 1
+  senão
+    x := x * 2
+  fim
+  repita
+    x := x + 1
+  até x > 20
+  escreva(x)
+  retorna(x)
+fim
+
+'''
+
+
+def gencode_program(lines, edited=None):
+    # Programa com aproximadamente 'lines' linhas para a geração de código;
+    # a função de número 'edited' tem uma atribuição a mais.
+    functions = max(1, lines // GENCODE_FUNCTION.count('\n'))
+    parts = []
+    for k in range(functions):
+        function = GENCODE_FUNCTION.replace('{k}', str(k))
+        if k == edited:
+            function = function.replace('  escreva(x)\n', '  x := x + 1\n  escreva(x)\n')
+        parts.append(function)
+    parts.append('inteiro principal()\n  retorna(f0(1))\nfim\n')
+    return ''.join(parts)
@@ -1,14 +1,198 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import concurrent.futures
+
+import mytree
+import tpplex
 import tppparser
-import tppsema
-from tppgencode import GenCode
+from myerror import report, TooManyMessages
+from tppcompiler import Compilation
+
+def expand_inputs(inputs):
+    # Aceita arquivos, diretórios (todos os .tpp do diretório) e padrões glob.
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(sorted(glob.glob(os.path.join(item, '*.tpp'))))
+        elif glob.has_magic(item):
+            files.extend(sorted(glob.glob(item)))
+        else:
+            files.append(item)
+    return files
+
+def dump_tokens(path, lexer='ply'):
+    # O arquivo de saída tem um buffer grande: os tokens são escritos à medida
+    # que são lidos, sem acumular a saída.
+    output = open(path + '.tokens', 'w', buffering=1 << 20)
+    tpplex.dump_tokens(path, output, lexer)
+    output.close()
+
+def warm_up():
+    # Carrega lexer, tabelas do parser e LLVM uma única vez por processo.
+    import tpplex
+    from tppgencode import getTargetMachine
+    tpplex.get_lexer()
+    tppparser.get_parser()
+    getTargetMachine()
+
+def compile_job(path, emit_ast='none', flat=False, direct=False, lexer='ply', cache=False, incremental=False,
+                opt=0):
+    # Executado nos workers: as mensagens do compilador ficam na compilação
+    # e são devolvidas junto com o IR, para serem mostradas na ordem da entrada.
+    start = time.perf_counter()
+    code = None
+    compilation = None
+    try:
+        compilation = Compilation.from_file(path, emit_ast, flat, direct, lexer, cache, incremental, opt)
+        code = compilation.run()
+        status = 'ok' if code != None else 'erro: IR inválido' if compilation.hasTree() else 'sem árvore'
+    except Exception as e:
+        status = 'erro: %s' % e
+    diagnostics = ''.join(message + '\n' for message in compilation.errors) if compilation else ''
+    return path, code, diagnostics, status, time.perf_counter() - start
+
+def server_job(path, emit_ast='none', flat=False, direct=False, lexer='ply', cache=False, incremental=False,
+               opt=0):
+    # Como compile_job, mas no servidor de compilação (tppserver) se ele
+    # estiver em execução.
+    import tppserver
+    response = tppserver.submit({'path': os.path.abspath(path), 'emit_ast': emit_ast, 'flat': flat,
+                                 'direct': direct, 'lexer': lexer, 'cache': cache, 'incremental': incremental,
+                                 'opt': opt})
+    diagnostics = ''.join(message + '\n' for message in response['diagnostics'])
+    return path, response['ir'], diagnostics, response['status'], response['elapsed']
+
+def run_batch(inputs, jobs=1, emit_ast='none', flat=False, direct=False, lexer='ply', cache=False,
+              incremental=False, server=False, opt=0, emit_obj=False):
+    files = expand_inputs(inputs)
+    options = ([emit_ast] * len(files), [flat] * len(files), [direct] * len(files), [lexer] * len(files),
+               [cache] * len(files), [incremental] * len(files), [opt] * len(files))
+
+    if server:
+        # As requisições simultâneas são atendidas em threads do servidor.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(server_job, files, *options))
+    elif jobs > 1:
+        warm_up()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=warm_up) as executor:
+            results = list(executor.map(compile_job, files, *options))
+    else:
+        warm_up()
+        results = map(compile_job, files, *options)
+
+    summary = []
+    for path, code, diagnostics, status, elapsed in results:
+        sys.stdout.write(diagnostics)
+        if code != None:
+            file = open(os.path.splitext(path)[0] + '.ll', 'w')
+            file.write(code)
+            file.close()
+            if emit_obj:
+                from tppgencode import emitObject
+                if not emitObject(code, os.path.splitext(path)[0] + '.o', opt):
+                    status = 'erro: IR inválido'
+        summary.append((path, status, elapsed))
+
+    total = 0
+    print('%-40s %10s  %s' % ('arquivo', 'tempo (ms)', 'status'))
+    for path, status, elapsed in summary:
+        total += elapsed
+        print('%-40s %10.1f  %s' % (path, elapsed * 1000, status))
+    print('%-40s %10.1f' % ('total (%d arquivos)' % len(summary), total * 1000))
+
+    return all(status == 'ok' for path, status, elapsed in summary)
+
+def positive(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('deve ser maior que zero: %s' % value)
+    return number
 
 if __name__ == "__main__":
-    tppparser.main()
-    if tppparser.root != None and tppparser.root.children != ():
-        # Análise semantica
-        tppsema.root = tppparser.root
-        # tppsema.checkRules()
-        tppsema.pruneTree()
-
-        # Geração de código
-        GenCode().declaration(tppsema.root)
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description='Compilador TPP.')
+    arg_parser.add_argument('file', nargs='+', help='arquivo .tpp (ou diretórios/padrões glob com --batch)')
+    arg_parser.add_argument('--batch', action='store_true', help='compila vários arquivos, gerando um .ll por entrada')
+    arg_parser.add_argument('-j', '--jobs', type=positive, default=1, help='número de processos usados com --batch')
+    arg_parser.add_argument('--emit-ast', choices=mytree.EXPORT_FORMATS, default='none',
+                            help='exporta as árvores sintática e podada (.dot, ou .dot e .png)')
+    arg_parser.add_argument('--flat-ast', action='store_true',
+                            help='gera o código a partir da árvore podada em arrays (menos memória retida depois da poda; '
+                                 'o pico durante o parse não muda)')
+    arg_parser.add_argument('--direct-ast', action='store_true',
+                            help='o parser gera a árvore podada diretamente (sem exportar a árvore sintática)')
+    arg_parser.add_argument('--lexer', choices=tpplex.LEXERS, default='ply',
+                            help='implementação do lexer: ply.lex, o scanner de uma única expressão regular ou '
+                                 'o scanner sobre o arquivo mapeado na memória (mmap)')
+    arg_parser.add_argument('--dump-tokens', action='store_true',
+                            help='só grava os tokens de cada arquivo em <arquivo>.tokens (um tipo por linha)')
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            help='não usa a cache das árvores podadas (sempre analisa o código)')
+    arg_parser.add_argument('--incremental', action='store_true',
+                            help='reaproveita da cache o IR das funções que não mudaram')
+    arg_parser.add_argument('-O', dest='opt', type=int, choices=[0, 1, 2, 3], default=0,
+                            help='nível de otimização do código gerado (-O0 a -O3)')
+    arg_parser.add_argument('--emit-obj', action='store_true',
+                            help='grava também o arquivo objeto (.o) de cada entrada')
+    arg_parser.add_argument('--server', action='store_true',
+                            help='com --batch, compila no servidor (tppserver.py), se estiver em execução')
+    arg_parser.add_argument('--log', action='store_true', help='grava o log de depuração em parser.log')
+    args = arg_parser.parse_args()
+
+    if args.log:
+        tppparser.setup_log()
+
+    if args.dump_tokens:
+        for path in expand_inputs(args.file):
+            dump_tokens(path, args.lexer)
+    elif args.batch:
+        if not run_batch(args.file, args.jobs, args.emit_ast, args.flat_ast, args.direct_ast, args.lexer,
+                         not args.no_cache, args.incremental, args.server, args.opt, args.emit_obj):
+            sys.exit(1)
+    else:
+        if len(args.file) > 1:
+            arg_parser.error('use --batch para compilar mais de um arquivo')
+
+        path = args.file[0]
+        if path.split('.')[-1] != 'tpp':
+            raise IOError(tppparser.error_handler.newError('ERR-SYN-NOT-TPP'))
+        elif not os.path.exists(path):
+            raise IOError(tppparser.error_handler.newError('ERR-SYN-FILE-NOT-EXISTS'))
+
+        # Os tokens são lidos do arquivo em pedaços; a árvore podada vem da
+        # cache, se o arquivo já foi compilado com as mesmas opções.
+        compilation = Compilation.from_file(path, args.emit_ast, args.flat_ast, args.direct_ast, args.lexer,
+                                            not args.no_cache, args.incremental, args.opt, stream=True)
+        code = None
+        failure = None
+        try:
+            code = compilation.run()
+        except (TooManyMessages, tppparser.RecoveryLoop) as e:
+            failure = e
+        finally:
+            for message in compilation.errors:
+                print(message)
+
+        if failure is not None:
+            # Compilação interrompida: o motivo (se ainda não foi mostrado) é
+            # a última mensagem.
+            if str(failure):
+                print(failure)
+            sys.exit(1)
+
+        if code is None:
+            # Sem árvore; com árvore, o LLVM rejeitou o IR e o erro já foi mostrado.
+            if not compilation.hasTree():
+                report(tppparser.error_handler.newError('WAR-SYN-NOT-GEN-SYN-TREE'))
+            sys.exit(1)
+        else:
+            # Geração de código
+            file = open('meu_modulo.ll', 'w')
+            file.write(code)
+            file.close()
+            if args.emit_obj:
+                from tppgencode import emitObject
+                if not emitObject(code, 'meu_modulo.o', args.opt):
+                    sys.exit(1)
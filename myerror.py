@@ -1,16 +1,49 @@
 import configparser
-import inspect
+import contextvars
 
 config = None
 
+# Destino das mensagens da compilação corrente. Sem uma compilação ativa
+# (ver tppcompiler.Compilation) as mensagens são impressas, como antes.
+diagnostics = contextvars.ContextVar('diagnostics', default=None)
+
+# Máximo de mensagens guardadas por compilação: ao atingir o limite, a
+# compilação é interrompida (TooManyMessages).
+MAX_DIAGNOSTICS = 10000
+
+class TooManyMessages(Exception):
+  pass
+
+def report(message):
+  errors = diagnostics.get()
+  if errors is None:
+    print(message)
+  elif len(errors) >= MAX_DIAGNOSTICS:
+    raise TooManyMessages(MyError('Errors', showErrorMessage=True).newError('ERR-TOO-MANY-MESSAGES').format(len(errors)))
+  else:
+    errors.append(message)
+
+def load_config():
+  # As mensagens são lidas uma única vez, no primeiro erro reportado.
+  global config
+  # O global só é atribuído depois da leitura: outra thread não vê o
+  # parser ainda vazio.
+  if config is None:
+    parser = configparser.RawConfigParser()
+    parser.read('ErrorMessages.properties')
+    config = parser
+  return config
+
 class MyError():
 
   def __init__(self, et, showErrorMessage=False):
-    self.config = configparser.RawConfigParser()
-    self.config.read('ErrorMessages.properties')
     self.errorType = et
     self.showErrorMessage = showErrorMessage
 
+  @property
+  def config(self):
+    return load_config()
+
   def newError(self, key, **data):
     message = ''
     if (self.showErrorMessage):
@@ -22,4 +55,4 @@ class MyError():
     else:
       message = key
 
-    return message
\ No newline at end of file
+    return message
@@ -1,6 +1,8 @@
-from anytree import Node, RenderTree, AsciiStyle, PreOrderIter
-from anytree.exporter import DotExporter
-from anytree import NodeMixin, RenderTree
+import threading
+import itertools
+import subprocess
+import contextvars
+import concurrent.futures
 
 # "type": [PROGRAMA, ID, SE]
 # "scope": [Node's scope]
@@ -34,29 +36,113 @@ from anytree import NodeMixin, RenderTree
 # root = None
 # global node_sequence
 
-node_sequence = 0
+# Sequência usada nos ids dos nós. Cada compilação (e cada thread) tem a sua
+# própria sequência, iniciada por reset_sequence().
+node_sequence = contextvars.ContextVar('node_sequence', default=None)
 
-class MyNode(NodeMixin):  # Add Node feature   
+def reset_sequence():
+  node_sequence.set(itertools.count())
+
+class MyNode():
+  # Nó da árvore sintática com __slots__: os filhos ficam em uma lista e o id
+  # ('<número>: <nome>') só é montado quando consultado (exportação). As
+  # folhas (metade dos nós) não alocam a lista de filhos. A
+  # interface segue a do anytree (name, parent, children, ancestors); para
+  # os exportadores do anytree use toAnytree().
+
+  __slots__ = ('name', 'type', 'line', '_id', '_parent', '_children',
+               'scope', 'inIndex', 'inArgument')
 
   def __init__(self, name, parent=None, id=None, type=None, label=None, children=None, line=None):
-    super(MyNode, self).__init__()
-    global node_sequence
-
-    if (id):
-      self.id = id
-    else:
-      self.id = str(node_sequence) + ': ' + str(name)
-        
-    self.label = name
-    # self.name = name + '_' + str(node_sequence)
+    sequence = node_sequence.get()
+    if sequence is None:
+      reset_sequence()
+      sequence = node_sequence.get()
+
+    # Número do nó na sequência, ou o id informado.
+    number = next(sequence)
+    self._id = id if id else number
     self.name = name
-    node_sequence = node_sequence + 1
     self.type = type
-    self.parent = parent
     self.line = line
+    self._parent = None
+    self._children = None
+    if parent is not None:
+      self.parent = parent
     if children:
       self.children = children
 
+  @property
+  def id(self):
+    if type(self._id) is int:
+      return str(self._id) + ': ' + str(self.name)
+    return self._id
+
+  @id.setter
+  def id(self, id):
+    self._id = id
+
+  @property
+  def label(self):
+    return self.name
+
+  @property
+  def parent(self):
+    return self._parent
+
+  @parent.setter
+  def parent(self, parent):
+    if self._parent is parent:
+      return
+    if self._parent is not None:
+      self._parent._children.remove(self)
+    self._parent = parent
+    if parent is not None:
+      if parent._children is None:
+        parent._children = [self]
+      else:
+        parent._children.append(self)
+
+  @property
+  def children(self):
+    if self._children is None:
+      return ()
+    return tuple(self._children)
+
+  @children.setter
+  def children(self, children):
+    # Como no anytree: os filhos antigos ficam sem pai e os novos são
+    # retirados do pai anterior.
+    children = list(children) or None
+    for child in self._children or ():
+      child._parent = None
+    for child in children or ():
+      if child._parent is not None:
+        child._parent._children.remove(child)
+      child._parent = self
+    self._children = children
+
+  @property
+  def ancestors(self):
+    ancestors = []
+    node = self._parent
+    while node is not None:
+      ancestors.append(node)
+      node = node._parent
+    ancestors.reverse()
+    return tuple(ancestors)
+
+  # Nome antigo (e com erro de grafia) usado pelo anytree.
+  anchestors = ancestors
+
+  @property
+  def is_leaf(self):
+    return not self._children
+
+  @property
+  def is_root(self):
+    return self._parent is None
+
   def nodenamefunc(node):
     return '%s' % (node.name)
 
@@ -69,3 +155,68 @@ class MyNode(NodeMixin):  # Add Node feature
 
   def edgetypefunc(node, child):
     return '--'
+
+
+# Exportação da árvore (.dot / .png)
+#
+# O texto .dot é gerado na hora, pois a árvore ainda será podada/alterada
+# pela compilação; gravar o arquivo e chamar o 'dot' para gerar a imagem
+# (a parte cara) fica para uma thread em segundo plano.
+
+EXPORT_FORMATS = ['none', 'dot', 'png']
+
+export_executor = None
+export_lock = threading.Lock()
+# Exportações pendentes de quem não mantém a própria lista (tppparser.main e
+# tppsema.pruneTree).
+exports = []
+
+def writeExport(lines, dotfile, picture):
+  try:
+    with open(dotfile, 'w') as file:
+      for line in lines:
+        file.write('%s\n' % line)
+    if picture:
+      subprocess.check_call(['dot', dotfile, '-T', 'png', '-o', picture])
+  except Exception as e:
+    return '%s: %s' % (picture or dotfile, e)
+  return None
+
+def toAnytree(root):
+  # Cópia da árvore com nós do anytree, usada apenas pelos exportadores.
+  from anytree import Node
+
+  copy = Node(root.name, id=root.id, type=root.type, line=root.line)
+  stack = [(root, copy)]
+  while stack:
+    node, parent = stack.pop()
+    for child in node.children:
+      stack.append((child, Node(child.name, parent=parent, id=child.id, type=child.type, line=child.line)))
+  return copy
+
+def exportTree(root, name, emit, unique=True, picture=True):
+  # Grava name.dot (emit 'dot' ou 'png') e name.png (emit 'png').
+  global export_executor
+  if emit == 'none':
+    return None
+
+  from anytree.exporter import DotExporter, UniqueDotExporter
+  exporter = UniqueDotExporter if unique else DotExporter
+  lines = list(exporter(toAnytree(root)))
+  picture = name + '.png' if emit == 'png' and picture else None
+
+  with export_lock:
+    if export_executor is None:
+      export_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='tpp-export')
+  return export_executor.submit(writeExport, lines, name + '.dot', picture)
+
+def waitExports(futures):
+  # Espera as exportações terminarem e retorna as mensagens das que falharam.
+  failures = []
+  for future in futures:
+    if future is not None:
+      error = future.result()
+      if error:
+        failures.append(error)
+  del futures[:]
+  return failures
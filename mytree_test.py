@@ -0,0 +1,33 @@
+import mytree
+from mytree import MyNode
+from anytree.exporter import DotExporter
+
+def test_001():
+    # Os ids são montados sob demanda a partir da sequência da compilação.
+    mytree.reset_sequence()
+    a = MyNode(name='a')
+    b = MyNode(name='b', parent=a)
+    c = MyNode(name='c', id='raiz')
+    assert (a.id, b.id, c.id) == ('0: a', '1: b', 'raiz')
+
+def test_002():
+    # Atribuir filhos retira os nós do pai anterior, como no anytree.
+    a = MyNode(name='a')
+    b = MyNode(name='b', parent=a)
+    c = MyNode(name='c', parent=b)
+    d = MyNode(name='d', parent=b)
+    a.children = (c, b)
+    assert a.children == (c, b)
+    assert b.children == (d,)
+    assert c.parent is a
+    assert d.ancestors == (a, b)
+    assert d.is_leaf and not b.is_leaf
+
+def test_003():
+    # Os exportadores do anytree recebem uma cópia da árvore.
+    a = MyNode(name='a')
+    MyNode(name='b', parent=a)
+    MyNode(name='c', parent=a, children=[MyNode(name='d')])
+    lines = list(DotExporter(mytree.toAnytree(a)))
+    assert '    "a" -> "b";' in lines
+    assert '    "c" -> "d";' in lines
@@ -0,0 +1,339 @@
+import copy
+import threading
+
+import ply.yacc as yacc
+
+import tppparser
+from mytree import MyNode
+
+# Ações alternativas para as regras do tppparser que montam diretamente a
+# árvore podada (a forma produzida por tppsema.pruneDeclaration e usada por
+# GenCode.declaration), sem os nós intermediários da árvore concreta e sem a
+# travessia de poda.
+#
+# As funções têm os nomes das regras do tppparser e são associadas às mesmas
+# tabelas LALR; as regras de erro e p_error continuam sendo as do tppparser.
+# As listas recursivas à esquerda reaproveitam o nó da lista e só acrescentam
+# o novo filho. As expressões são listas de nós (a sequência infixa gerada
+# por pruneExpression) até chegarem ao nó expressao.
+#
+# A árvore concreta não é gerada: para exportar .ast/.unique.ast ou executar
+# tppsema.checkRules use o parser do tppparser.
+
+build_lock = threading.Lock()
+
+def reuse(p, recursive, name, type):
+    # Nó de uma lista recursiva à esquerda. A linha é atualizada a cada
+    # redução, como a do último nó criado na árvore concreta. Um nó de erro
+    # no lugar da lista é descartado, como na poda.
+    if recursive and p[1].name == name:
+        node = p[1]
+        node.line = p.lexer.lineno
+    else:
+        node = MyNode(name=name, type=type, line=p.lexer.lineno)
+    p[0] = node
+    return node
+
+def sequence(value):
+    # Expressão como lista de nós (um nó de erro vira uma lista de um nó).
+    if isinstance(value, list):
+        return value
+    return [value]
+
+def p_programa(p):
+    programa = MyNode(name='programa', type='PROGRAMA', line=p.lexer.lineno)
+    p[0] = programa
+    p[1].parent = programa
+
+# (lista_declaracoes) com as declarações como filhos.
+def p_lista_declaracoes(p):
+    pai = reuse(p, len(p) > 2, 'lista_declaracoes', 'LISTA_DECLARACOES')
+    p[len(p) - 1].parent = pai
+
+def p_declaracao(p):
+    p[0] = p[1]
+
+#      (declaracao_variaveis)
+#      /         |          \
+# (inteiro)     (:)     (lista_variaveis)
+def p_declaracao_variaveis(p):
+    pai = MyNode(name='declaracao_variaveis', type='DECLARACAO_VARIAVEIS', line=p.lexer.lineno)
+    p[0] = pai
+    p[1].parent = pai
+    MyNode(name=p[2], type='SIMBOLO', parent=pai, line=p.lexer.lineno)
+    p[3].parent = pai
+
+def p_inicializacao_variaveis(p):
+    pai = MyNode(name='inicializacao_variaveis', type='INICIALIZACAO_VARIAVEIS', line=p.lexer.lineno)
+    p[0] = pai
+    p[1].parent = pai
+
+def p_lista_variaveis(p):
+    pai = reuse(p, len(p) > 2, 'lista_variaveis', 'LISTA_VARIAVEIS')
+    p[len(p) - 1].parent = pai
+
+#       (var)
+#      /     \
+#   (a)    (indice)
+def p_var(p):
+    pai = MyNode(name='var', type='VAR', line=p.lexer.lineno)
+    p[0] = pai
+    MyNode(name=p[1], type='ID', parent=pai, line=p.lexer.lineno)
+    if len(p) > 2:
+        p[2].parent = pai
+
+#            (indice)
+#    /    /     |     \     \      \
+#  ([) (expr)  (])   ([)  (expr)  (])
+def p_indice(p):
+    recursive = len(p) == 5
+    pai = reuse(p, recursive, 'indice', 'INDICE')
+    if recursive:
+        abre, expressao, fecha = p[2], p[3], p[4]
+    else:
+        abre, expressao, fecha = p[1], p[2], p[3]
+    MyNode(name=abre, type='SIMBOLO', parent=pai, line=p.lexer.lineno)
+    expressao.parent = pai
+    MyNode(name=fecha, type='SIMBOLO', parent=pai, line=p.lexer.lineno)
+
+# O tipo é só a folha (inteiro) ou (flutuante).
+def p_tipo(p):
+    p[0] = MyNode(name=p[1], type=p[1].upper(), line=p.lexer.lineno)
+
+#                   (declaracao_funcao)
+#    /      /     /        |          \       \       \
+# (tipo) (nome) (()  (lista_parametros) ())  (corpo)  (fim)
+def p_declaracao_funcao(p):
+    pai = MyNode(name='declaracao_funcao', type='DECLARACAO_FUNCAO', line=p.lexer.lineno)
+    p[0] = pai
+    if len(p) == 3:
+        p[1].parent = pai
+    for child in sequence(p[len(p) - 1]):
+        child.parent = pai
+
+# O cabeçalho é a lista dos filhos que ele acrescenta à declaração da função.
+def p_cabecalho(p):
+    line = p.lexer.lineno
+    p[0] = [MyNode(name=p[1], type='ID', line=line),
+            MyNode(name='(', type='SIMBOLO', line=line),
+            p[3],
+            MyNode(name=')', type='SIMBOLO', line=line),
+            p[5],
+            MyNode(name='fim', type='FIM', line=line)]
+
+def p_lista_parametros(p):
+    pai = reuse(p, len(p) > 2, 'lista_parametros', 'LISTA_PARAMETROS')
+    parametro = p[len(p) - 1]
+    if parametro is None:
+        parametro = MyNode(name='vazio', type='VAZIO', line=p.lexer.lineno)
+    parametro.parent = pai
+
+#            (parametro)
+#    /     /    |     \     \
+# (tipo) (:)   (a)   ([)   (])
+def p_parametro(p):
+    recursive = p[2] != ':'
+    pai = reuse(p, recursive, 'parametro', 'PARAMETRO')
+    if recursive:
+        MyNode(name='[', type='SIMBOLO', parent=pai, line=p.lexer.lineno)
+        MyNode(name=']', type='SIMBOLO', parent=pai, line=p.lexer.lineno)
+    else:
+        p[1].parent = pai
+        MyNode(name=':', type='SIMBOLO', parent=pai, line=p.lexer.lineno)
+        MyNode(name=p[3], type='ID', parent=pai, line=p.lexer.lineno)
+
+# (corpo) com as ações como filhos; o vazio não gera nó.
+def p_corpo(p):
+    pai = reuse(p, len(p) > 2, 'corpo', 'CORPO')
+    if len(p) > 2:
+        p[2].parent = pai
+
+def p_acao(p):
+    p[0] = p[1]
+
+#               (se)
+#   /     /      |      \      \      \      \
+# (se) (expr) (então) (corpo) (SENAO) (corpo) (FIM)
+#                               |              |
+#                            (senão)         (fim)
+def p_se(p):
+    pai = MyNode(name='se', type='SE', line=p.lexer.lineno)
+    p[0] = pai
+    MyNode(name=p[1], type='SE', parent=pai, line=p.lexer.lineno)
+    p[2].parent = pai
+    MyNode(name=p[3], type='ENTAO', parent=pai, line=p.lexer.lineno)
+    p[4].parent = pai
+
+    if len(p) == 8:
+        senao = MyNode(name='SENAO', type='SENAO', parent=pai, line=p.lexer.lineno)
+        MyNode(name=p[5], type='SENAO', parent=senao, line=p.lexer.lineno)
+        p[6].parent = pai
+        fim = MyNode(name='FIM', type='FIM', parent=pai, line=p.lexer.lineno)
+        MyNode(name=p[7], type='FIM', parent=fim, line=p.lexer.lineno)
+    else:
+        fim = MyNode(name='fim', type='FIM', parent=pai, line=p.lexer.lineno)
+        MyNode(name=p[5], type='FIM', parent=fim, line=p.lexer.lineno)
+
+def p_repita(p):
+    pai = MyNode(name='repita', type='REPITA', line=p.lexer.lineno)
+    p[0] = pai
+    MyNode(name=p[1], type='REPITA', parent=pai, line=p.lexer.lineno)
+    p[2].parent = pai  # corpo.
+    MyNode(name=p[3], type='ATE', parent=pai, line=p.lexer.lineno)
+    p[4].parent = pai  # expressao.
+
+def p_atribuicao(p):
+    pai = MyNode(name='atribuicao', type='ATRIBUICAO', line=p.lexer.lineno)
+    p[0] = pai
+    p[1].parent = pai
+    MyNode(name=':=', type='SIMBOLO', parent=pai, line=p.lexer.lineno)
+    p[3].parent = pai
+
+# leia, escreva e retorna: (nome) (() (var ou expressao) ())
+def special_function(p, name, type):
+    pai = MyNode(name=name, type=type, line=p.lexer.lineno)
+    p[0] = pai
+    MyNode(name=p[1], type=type, parent=pai, line=p.lexer.lineno)
+    MyNode(name='(', type='SIMBOLO', parent=pai, line=p.lexer.lineno)
+    p[3].parent = pai
+    MyNode(name=')', type='SIMBOLO', parent=pai, line=p.lexer.lineno)
+
+def p_leia(p):
+    special_function(p, 'leia', 'LEIA')
+
+def p_escreva(p):
+    special_function(p, 'escreva', 'ESCREVA')
+
+def p_retorna(p):
+    special_function(p, 'retorna', 'RETORNA')
+
+# (expressao) com a sequência infixa de operandos e operadores como filhos.
+# Uma atribuição usada como expressão continua sendo o nó atribuicao.
+def p_expressao(p):
+    if not isinstance(p[1], list):
+        p[0] = p[1]
+        return
+    pai = MyNode(name='expressao', type='EXPRESSAO', line=p.lexer.lineno)
+    p[0] = pai
+    for child in p[1]:
+        child.parent = pai
+
+def binary(p):
+    # expressao_X : expressao_Y | expressao_X operador expressao_Y
+    p[0] = sequence(p[1])
+    if len(p) > 2:
+        p[0].append(p[2])
+        p[0].extend(sequence(p[3]))
+
+def p_expressao_logica(p):
+    binary(p)
+
+def p_expressao_simples(p):
+    binary(p)
+
+def p_expressao_aditiva(p):
+    binary(p)
+
+def p_expressao_multiplicativa(p):
+    binary(p)
+
+def p_expressao_unaria(p):
+    if len(p) > 2:
+        p[0] = [p[1]] + sequence(p[2])
+    else:
+        p[0] = sequence(p[1])
+
+# Os operadores são só a folha com o símbolo.
+def operator(p):
+    p[0] = MyNode(name=p[1], type='SIMBOLO', line=p.lexer.lineno)
+
+def p_operador_relacional(p):
+    operator(p)
+
+def p_operador_soma(p):
+    operator(p)
+
+def p_operador_logico(p):
+    operator(p)
+
+def p_operador_negacao(p):
+    operator(p)
+
+def p_operador_multiplicacao(p):
+    operator(p)
+
+# Fator entre parênteses: ( e ) ficam na sequência da expressão externa.
+def p_fator(p):
+    if len(p) > 2:
+        expressao = p[2]
+        if expressao.name == 'expressao':
+            inner = list(expressao.children)
+            expressao.children = ()
+        else:
+            inner = [expressao]
+        p[0] = ([MyNode(name=p[1], type='SIMBOLO', line=p.lexer.lineno)] + inner +
+                [MyNode(name=p[3], type='SIMBOLO', line=p.lexer.lineno)])
+    else:
+        p[0] = [p[1]]
+
+#  (NUM_INTEIRO)
+#       |
+#     (10)
+def p_numero(p):
+    if str(p[1]).find('.') == -1:
+        name = 'NUM_INTEIRO'
+    elif str(p[1]).find('e') >= 0:
+        name = 'NUM_NOTACAO_CIENTIFICA'
+    else:
+        name = 'NUM_PONTO_FLUTUANTE'
+    numero = MyNode(name=name, type=name, line=p.lexer.lineno)
+    MyNode(name=p[1], type='VALOR', parent=numero, line=p.lexer.lineno)
+    p[0] = numero
+
+#           (chamada_funcao)
+#    /      /        |          \
+# (nome)  (()  (lista_argumentos) ())
+def p_chamada_funcao(p):
+    pai = MyNode(name='chamada_funcao', type='CHAMADA_FUNCAO', line=p.lexer.lineno)
+    p[0] = pai
+    MyNode(name=p[1], type='ID', parent=pai, line=p.lexer.lineno)
+    MyNode(name=p[2], type='SIMBOLO', parent=pai, line=p.lexer.lineno)
+    p[3].parent = pai
+    MyNode(name=p[4], type='SIMBOLO', parent=pai, line=p.lexer.lineno)
+
+def p_lista_argumentos(p):
+    pai = reuse(p, len(p) > 2, 'lista_argumentos', 'LISTA_ARGUMENTOS')
+    argumento = p[len(p) - 1]
+    if argumento is None:
+        argumento = MyNode(name='vazio', type='VAZIO', line=p.lexer.lineno)
+    argumento.parent = pai
+
+# O vazio só gera nó nas listas de parâmetros e de argumentos.
+def p_vazio(p):
+    p[0] = None
+
+def build_parser():
+    # Mesmas tabelas LALR do tppparser, com as produções associadas às ações
+    # deste módulo (as que não são redefinidas aqui continuam as originais).
+    concrete = tppparser.get_parser()
+    table = yacc.LRTable()
+    table.lr_action = concrete.action
+    table.lr_goto = concrete.goto
+    table.lr_productions = [copy.copy(production) for production in concrete.productions]
+
+    actions = dict(vars(tppparser))
+    actions.update((name, rule) for name, rule in globals().items() if name.startswith('p_'))
+    table.bind_callables(actions)
+    return yacc.LRParser(table, tppparser.p_error)
+
+def get_parser():
+    global parser
+    with build_lock:
+        try:
+            return parser
+        except NameError:
+            parser = build_parser()
+            return parser
+
+def new_parser():
+    return copy.copy(get_parser())
@@ -0,0 +1,37 @@
+import pytest
+import tppparser
+import tppsema
+from tppcompiler import Compilation
+
+files = ['tests/gencode-001.tpp', 'tests/gencode-010.tpp', 'tests/gencode-013.tpp', 'tests/gencode-014.tpp']
+
+def preorder(node):
+    nodes = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        nodes.append((node.name, node.type, node.line, len(node.children)))
+        stack.extend(reversed(node.children))
+    return nodes
+
+def test_001():
+    # O parser direto monta a mesma árvore que a poda da árvore concreta.
+    for path in files:
+        source = open(path).read()
+        pruned = tppparser.parse(source)
+        tppsema.pruneDeclaration(pruned)
+        assert preorder(tppparser.parse(source, direct=True)) == preorder(pruned)
+
+def test_002():
+    # Função sem tipo: mesmos filhos da função com tipo, sem a folha do tipo.
+    source = 'f(inteiro: a)\n  escreva(a)\nfim\n'
+    function = tppparser.parse(source, direct=True).children[0].children[0]
+    typed = tppparser.parse('inteiro ' + source, direct=True).children[0].children[0]
+    assert [node.name for node in function.children] == [node.name for node in typed.children][1:]
+
+def test_003():
+    # A compilação com a árvore direta gera o mesmo módulo.
+    for path in files:
+        assert Compilation.from_file(path, direct=True).run() == Compilation.from_file(path).run()
+    with pytest.raises(ValueError):
+        Compilation.from_file(files[0], direct=True).run(check=True)
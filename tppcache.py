@@ -0,0 +1,105 @@
+import os
+import threading
+
+# Versão do formato da cache. Deve ser incrementada sempre que o formato de
+# algum arquivo salvo mudar, assim as entradas antigas são ignoradas.
+CACHE_VERSION = 1
+
+
+def cache_dir(*parts):
+    # Diretório base: $TPP_CACHE_DIR, ou $XDG_CACHE_HOME/tpp, ou ~/.cache/tpp.
+    base = os.environ.get('TPP_CACHE_DIR')
+    if not base:
+        xdg = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        base = os.path.join(xdg, 'tpp')
+
+    path = os.path.join(base, 'v%d' % CACHE_VERSION, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def temp_path(path):
+    # Nome temporário único por processo/thread, no mesmo diretório do destino,
+    # para que o os.replace() final seja atômico.
+    return '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+
+
+def atomic_write(path, data):
+    # Escreve em um arquivo temporário e publica com os.replace(): leitores
+    # concorrentes veem o arquivo antigo ou o novo, nunca um arquivo parcial.
+    tmp = temp_path(path)
+    try:
+        with open(tmp, 'wb') as file:
+            file.write(data)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# Entradas de tamanho variável (ex.: árvores da cache de compilação), um
+# arquivo por chave no diretório do tipo de entrada. O tamanho total de cada
+# diretório é limitado: ao gravar, as entradas usadas há mais tempo (mtime,
+# atualizado a cada leitura) são removidas. $TPP_CACHE_LIMIT define o
+# limite em MB.
+DEFAULT_LIMIT = 256
+
+
+def cache_limit():
+    try:
+        return int(os.environ.get('TPP_CACHE_LIMIT', DEFAULT_LIMIT)) << 20
+    except ValueError:
+        return DEFAULT_LIMIT << 20
+
+
+def load_entry(kind, key):
+    # Conteúdo da entrada, ou None se ela não existe (ou não há cache).
+    try:
+        path = os.path.join(cache_dir(kind), key)
+        with open(path, 'rb') as file:
+            data = file.read()
+        os.utime(path)
+    except OSError:
+        return None
+    return data
+
+
+def store_entry(kind, key, data, limit=None):
+    store_entries(kind, [(key, data)], limit)
+
+
+def store_entries(kind, entries, limit=None):
+    # Grava várias entradas e verifica o limite uma única vez.
+    try:
+        directory = cache_dir(kind)
+        for key, data in entries:
+            atomic_write(os.path.join(directory, key), data)
+    except OSError:
+        return
+    evict(directory, cache_limit() if limit is None else limit)
+
+
+def evict(directory, limit):
+    # Remove as entradas menos usadas até o total caber no limite. Outros
+    # processos podem remover as mesmas entradas ao mesmo tempo.
+    entries = []
+    total = 0
+    with os.scandir(directory) as scan:
+        for entry in scan:
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            total += stat.st_size
+    entries.sort()
+    for mtime, size, path in entries:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
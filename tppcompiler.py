@@ -0,0 +1,255 @@
+import struct
+import hashlib
+import itertools
+import contextlib
+
+import mytree
+import myerror
+import tpplex
+import tppscan
+import tppparser
+import tppsema
+import tppflat
+import tppast
+import tppcache
+
+
+# Cache da árvore podada: a chave é o hash do código, da versão do
+# compilador (o código dos módulos que geram a árvore e as mensagens), da
+# gramática e das opções que mudam a árvore ou as mensagens (análise
+# semântica, árvore direta e lexer). A entrada guarda as mensagens da análise e a árvore achatada no
+# formato binário do tppflat, que vai direto para a geração de código.
+TREE_MODULES = (tpplex, tppscan, tppparser, tppast, tppsema, tppflat, mytree, myerror)
+ENTRY_HEADER = struct.Struct('<II')
+
+def compiler_signature():
+    global signature
+    try:
+        return signature
+    except NameError:
+        pass
+    digest = hashlib.sha256(tppparser.grammar_signature().encode())
+    for module in TREE_MODULES:
+        with open(module.__file__, 'rb') as file:
+            digest.update(file.read())
+    try:
+        with open('ErrorMessages.properties', 'rb') as file:
+            digest.update(file.read())
+    except OSError:
+        pass
+    signature = digest.hexdigest()
+    return signature
+
+def cache_key(source, check=False, direct=False, lexer='ply'):
+    # source é o código (str) ou os bytes do arquivo (mmap). Os lexers
+    # 'regex' e 'mmap' são o mesmo scanner (tppscan).
+    digest = hashlib.sha256(compiler_signature().encode())
+    digest.update(b'check' if check else b'parse')
+    digest.update(b'direct' if direct else b'concrete')
+    digest.update(b'ply' if lexer == 'ply' else b'tppscan')
+    digest.update(source.encode() if isinstance(source, str) else source)
+    return digest.hexdigest()
+
+def load_tree(key):
+    # (raiz achatada, mensagens) da cache, ou None.
+    data = tppcache.load_entry('ast', key)
+    if data is None:
+        return None
+    try:
+        count, size = ENTRY_HEADER.unpack_from(data)
+        offset = ENTRY_HEADER.size + size
+        messages = data[ENTRY_HEADER.size:offset].decode().split('\0') if count else []
+        if len(messages) != count:
+            return None
+        return tppflat.FlatTree.from_bytes(data[offset:]).root, messages
+    except (ValueError, struct.error):
+        # Entrada corrompida: é gerada novamente.
+        return None
+
+def store_tree(key, root, messages):
+    tree = root.tree if isinstance(root, tppflat.FlatNode) else tppflat.FlatTree.from_tree(root)
+    text = '\0'.join(messages).encode()
+    tppcache.store_entry('ast', key, ENTRY_HEADER.pack(len(messages), len(text)) + text + tree.to_bytes())
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Compilation():
+    # Estado completo de uma compilação: lexer, parser, árvore, tabela de
+    # símbolos, mensagens e o módulo gerado. Compilações diferentes não
+    # compartilham estado e podem executar ao mesmo tempo em threads
+    # diferentes de um mesmo processo.
+    #
+    # Com flat=True a árvore podada é convertida para a forma achatada
+    # (tppflat) antes da geração de código e a árvore de objetos é liberada.
+    # O parse ainda monta a árvore de objetos inteira: a forma achatada
+    # reduz a memória retida depois da poda, não o pico do parse.
+    #
+    # Com direct=True o parser monta diretamente a árvore podada (tppast): a
+    # poda não é executada e só a árvore podada pode ser exportada. A análise
+    # semântica (check) precisa da árvore concreta.
+    #
+    # lexer escolhe a implementação do lexer (tpplex.LEXERS). Com 'mmap',
+    # from_file mapeia o arquivo na memória e source são os bytes do arquivo.
+    #
+    # Com stream=True (from_file) os tokens são lidos do arquivo em pedaços
+    # (tpplex.TokenStream); source é o arquivo mapeado na memória e só é lido
+    # para a chave da cache.
+    #
+    # Com cache=True, run() procura a árvore podada na cache (load_tree) e,
+    # se encontra, vai direto para a geração de código. Sem exportação das
+    # árvores, que precisam ser geradas.
+    #
+    # Com incremental=True o IR de cada função também vem da cache, se a
+    # função e o que ela usa não mudaram (ver tppgencode).
+    #
+    # opt é o nível de otimização do IR retornado por run() (tppgencode.optimize).
+    #
+    # cancel(), chamado de outra thread, interrompe a compilação com
+    # Cancelled no próximo token lido ou no início da próxima etapa.
+
+    def __init__(self, source, path=None, emit_ast='none', flat=False, direct=False, lexer='ply', cache=False,
+                 incremental=False, opt=0, stream=False):
+        self.source = source
+        self.path = path
+        self.emit_ast = emit_ast if path else 'none'
+        self.flat = flat
+        self.direct = direct
+        self.cache = cache and self.emit_ast == 'none'
+        self.incremental = incremental
+        self.opt = opt
+        self.exports = []
+        self.lexerKind = lexer
+        self.stream = stream
+        self.lexer = tpplex.TokenStream(path, lexer) if stream else tpplex.new_lexer(lexer)
+        self.parser = tppast.new_parser() if direct else tppparser.new_parser()
+        self.root = None
+        self.table = None
+        self.errors = []
+        self.gencode = None
+        self.cancelled = False
+
+        self.sequence = itertools.count()
+        self.variablesError = set()
+
+    @classmethod
+    def from_file(cls, path, emit_ast='none', flat=False, direct=False, lexer='ply', cache=False,
+                  incremental=False, opt=0, stream=False):
+        if lexer == 'mmap' or stream:
+            source = tpplex.map_file(path)
+        else:
+            data = open(path)
+            source = data.read()
+            data.close()
+        return cls(source, path, emit_ast, flat, direct, lexer, cache, incremental, opt, stream)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def checkCancelled(self):
+        if self.cancelled:
+            raise Cancelled(self.path or '')
+
+    def nextToken(self):
+        self.checkCancelled()
+        return self.lexer.token()
+
+    @contextlib.contextmanager
+    def active(self):
+        # Direciona as mensagens, a sequência de nós e o estado da análise
+        # semântica para esta compilação enquanto o bloco executa.
+        self.checkCancelled()
+        tokens = [
+            (myerror.diagnostics, myerror.diagnostics.set(self.errors)),
+            (mytree.node_sequence, mytree.node_sequence.set(self.sequence)),
+            (tppsema.variablesError, tppsema.variablesError.set(self.variablesError)),
+        ]
+        try:
+            yield self
+        finally:
+            for var, token in reversed(tokens):
+                var.reset(token)
+
+    def hasTree(self):
+        return self.root != None and self.root.children != ()
+
+    def parse(self):
+        with self.active():
+            self.root = tppparser.run(self.parser, None if self.stream else self.source, self.lexer,
+                                      self.nextToken)
+        if self.hasTree() and not self.direct:
+            self.export('.unique.ast')
+            self.export('.ast', unique=False, picture=False)
+        return self.root
+
+    def check(self):
+        if self.direct:
+            raise ValueError(tppparser.error_handler.newError('ERR-SYN-DIRECT-AST-CHECK'))
+        with self.active():
+            self.table = tppsema.checkRules(self.root)
+        return self.table
+
+    def prune(self):
+        if not self.direct:
+            with self.active():
+                tppsema.pruneDeclaration(self.root)
+        self.export('.pruned.ast')
+        if self.flat:
+            self.root = tppflat.flatten(self.root)
+        return self.root
+
+    def generate(self):
+        # O llvmlite só é importado quando há código para gerar.
+        from tppgencode import GenCode
+
+        with self.active():
+            self.gencode = GenCode(self.incremental, opt=self.opt)
+            self.gencode.declaration(self.root, output=None)
+        return self.gencode.module
+
+    def code(self):
+        # Texto IR do módulo gerado; None (com o erro nas mensagens) se o
+        # LLVM rejeita o IR ao otimizar.
+        with self.active():
+            return self.gencode.code()
+
+    def export(self, suffix, unique=True, picture=True):
+        # A exportação executa em segundo plano enquanto a compilação continua.
+        if self.emit_ast != 'none':
+            name = self.path + suffix
+            self.exports.append(mytree.exportTree(self.root, name, self.emit_ast, unique, picture))
+
+    def waitExports(self):
+        for failure in mytree.waitExports(self.exports):
+            self.errors.append(tppparser.error_handler.newError('WAR-SYN-NOT-EXPORT-TREE').format(failure))
+
+    def load(self, key):
+        entry = load_tree(key)
+        if entry is None:
+            return False
+        self.root, messages = entry
+        self.errors.extend(messages)
+        return True
+
+    def run(self, check=False):
+        # Executa todas as etapas e retorna o código IR, ou None se não foi
+        # possível gerar a árvore sintática ou se o LLVM rejeitou o IR.
+        try:
+            key = cache_key(self.source, check, self.direct, self.lexerKind) if self.cache else None
+            if key and self.load(key):
+                self.generate()
+                return self.code()
+            self.parse()
+            if not self.hasTree():
+                return None
+            if check:
+                self.check()
+            self.prune()
+            if key:
+                store_tree(key, self.root, self.errors)
+            self.generate()
+            return self.code()
+        finally:
+            self.waitExports()
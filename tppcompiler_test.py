@@ -0,0 +1,75 @@
+import os
+import time
+import tppcache
+import tppcompiler
+import concurrent.futures
+from tppcompiler import Compilation
+
+files = ['tests/gencode-002.tpp', 'tests/gencode-010.tpp', 'tests/gencode-013.tpp']
+
+def compile_file(path):
+    compilation = Compilation.from_file(path)
+    code = compilation.run(check=True)
+    return code, compilation.errors
+
+def test_001():
+    # Compilar duas vezes o mesmo arquivo gera o mesmo resultado.
+    assert compile_file(files[0]) == compile_file(files[0])
+
+def test_002():
+    # Compilações simultâneas em threads não interferem umas nas outras.
+    expected = [compile_file(path) for path in files]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(compile_file, files * 8))
+    assert results == expected * 8
+
+def test_003():
+    # As mensagens ficam na compilação, separadas por arquivo.
+    compilation = Compilation('inteiro principal()\n  a := 1\n  retorna(0)\nfim\n')
+    compilation.parse()
+    compilation.check()
+    assert compilation.errors == ["Error: Variável 'a' não declarada."]
+
+def test_004(tmp_path, monkeypatch):
+    # A segunda compilação usa a árvore da cache: mesmo módulo e mensagens,
+    # sem analisar o código.
+    monkeypatch.setenv('TPP_CACHE_DIR', str(tmp_path))
+    for path in files:
+        expected = Compilation.from_file(path).run(check=True)
+        first = Compilation.from_file(path, cache=True)
+        assert first.run(check=True) == expected
+        second = Compilation.from_file(path, cache=True)
+        monkeypatch.setattr(second, 'parse', None)
+        assert second.run(check=True) == expected
+        assert second.errors == first.errors
+    assert len(os.listdir(tmp_path / 'v1' / 'ast')) == len(files)
+    # Outro código (ou outra análise) é outra entrada.
+    assert tppcompiler.cache_key('a') != tppcompiler.cache_key('b')
+    assert tppcompiler.cache_key('a') != tppcompiler.cache_key('a', check=True)
+
+def test_005(tmp_path, monkeypatch):
+    # As entradas usadas há mais tempo são removidas quando o limite é passado.
+    monkeypatch.setenv('TPP_CACHE_DIR', str(tmp_path))
+    for key in 'abc':
+        tppcache.store_entry('ast', key, b'x' * 100, limit=250)
+        time.sleep(0.02)
+        tppcache.load_entry('ast', 'a')
+        time.sleep(0.02)
+    assert sorted(os.listdir(tmp_path / 'v1' / 'ast')) == ['a', 'c']
+    # Entrada corrompida: é ignorada.
+    tppcache.store_entry('ast', 'a', b'lixo')
+    assert tppcompiler.load_tree('a') is None
+
+def test_006(tmp_path, monkeypatch):
+    # A árvore direta e a concreta, e os dois lexers, são entradas diferentes
+    # da cache; lendo o arquivo em pedaços, a entrada é a mesma.
+    monkeypatch.setenv('TPP_CACHE_DIR', str(tmp_path))
+    path = files[0]
+    options = [{}, {'direct': True}, {'lexer': 'regex'}, {'lexer': 'mmap'}, {'stream': True}]
+    for option in options:
+        expected = Compilation.from_file(path, **option).run()
+        assert Compilation.from_file(path, cache=True, **option).run() == expected
+    assert len(os.listdir(tmp_path / 'v1' / 'ast')) == 3
+    assert tppcompiler.cache_key('a') != tppcompiler.cache_key('a', direct=True)
+    assert tppcompiler.cache_key('a') != tppcompiler.cache_key('a', lexer='regex')
+    assert tppcompiler.cache_key('a', lexer='regex') == tppcompiler.cache_key(b'a', lexer='mmap')
@@ -0,0 +1,241 @@
+import sys
+import array
+import struct
+
+# Árvore sintática "achatada" (struct-of-arrays): cada nó é uma posição em
+# arrays de inteiros e os nomes, tipos e escopos ficam em uma tabela de
+# strings internadas. Os nós são gravados em largura, assim os filhos de um
+# nó ocupam posições consecutivas (first .. first + count).
+#
+# FlatNode é só uma visão (árvore, posição) com a mesma interface de leitura
+# do MyNode (name, type, line, children, parent, ancestors), então tppsema e
+# tppgencode percorrem a árvore achatada sem alterações. A árvore achatada
+# não pode ser podada: a poda é feita antes, na árvore de objetos.
+
+NONE = -1
+
+# Bits de FlatTree.flags.
+ANNOTATED = 1
+IN_INDEX = 2
+IN_ARGUMENT = 4
+
+# Arrays da árvore, na ordem em que são gravados por to_bytes().
+COLUMNS = ('names', 'types', 'lines', 'parents', 'first', 'counts', 'scopes', 'flags')
+
+# Cabeçalho do formato binário: identificação, tamanho de um inteiro do
+# array, ordem dos bytes, número de nós, de strings e bytes das strings.
+MAGIC = b'TPPF'
+HEADER = struct.Struct('<4sBBIII')
+
+
+class FlatTree():
+
+    def __init__(self):
+        self.strings = []
+        self.string_index = {}
+        self.names = array.array('i')
+        self.types = array.array('i')
+        self.lines = array.array('i')
+        self.parents = array.array('i')
+        self.first = array.array('i')
+        self.counts = array.array('i')
+        # Anotações da análise semântica (scope, inIndex, inArgument).
+        self.scopes = array.array('i')
+        self.flags = array.array('b')
+
+    @classmethod
+    def from_tree(cls, root):
+        # Converte uma árvore de MyNode, percorrendo-a em largura.
+        tree = cls()
+        intern = tree.intern
+        order = [root]
+        tree.parents.append(NONE)
+        position = 0
+        while position < len(order):
+            node = order[position]
+            children = node.children
+            tree.names.append(intern(node.name))
+            tree.types.append(intern(node.type))
+            tree.lines.append(node.line if node.line is not None else NONE)
+            tree.first.append(len(order))
+            tree.counts.append(len(children))
+            tree.parents.extend([position] * len(children))
+            order.extend(children)
+            position += 1
+        count = len(order)
+        tree.scopes = array.array('i', [NONE]) * count
+        tree.flags = array.array('b', [0]) * count
+        return tree
+
+    def intern(self, value):
+        if value is None:
+            return NONE
+        index = self.string_index.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(value)
+            self.string_index[value] = index
+        return index
+
+    def string(self, index):
+        return self.strings[index] if index != NONE else None
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def root(self):
+        return FlatNode(self, 0)
+
+    def nbytes(self):
+        # Bytes ocupados pelos arrays (sem a tabela de strings).
+        columns = [getattr(self, column) for column in COLUMNS]
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def to_bytes(self):
+        # Formato binário compacto (cache da árvore, ver tppcompiler): o
+        # cabeçalho, as strings em UTF-8 separadas por '\0' e o conteúdo dos
+        # arrays. Só vale na mesma arquitetura (tamanho e ordem dos inteiros).
+        strings = '\0'.join(self.strings).encode()
+        parts = [HEADER.pack(MAGIC, self.names.itemsize, sys.byteorder == 'little',
+                             len(self), len(self.strings), len(strings)), strings]
+        parts.extend(getattr(self, column).tobytes() for column in COLUMNS)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        # Lê o formato de to_bytes(); ValueError se os dados não são válidos.
+        try:
+            magic, itemsize, little, count, strings, size = HEADER.unpack_from(data)
+        except struct.error:
+            raise ValueError('árvore achatada inválida')
+        tree = cls()
+        if magic != MAGIC or itemsize != tree.names.itemsize or little != (sys.byteorder == 'little'):
+            raise ValueError('árvore achatada inválida')
+        offset = HEADER.size + size
+        tree.strings = [sys.intern(value) for value in data[HEADER.size:offset].decode().split('\0')]
+        if not strings:
+            tree.strings = []
+        if len(tree.strings) != strings:
+            raise ValueError('árvore achatada inválida')
+        tree.string_index = {value: index for index, value in enumerate(tree.strings)}
+        for column in COLUMNS:
+            values = getattr(tree, column)
+            end = offset + values.itemsize * count
+            values.frombytes(data[offset:end])
+            offset = end
+        if offset != len(data):
+            raise ValueError('árvore achatada inválida')
+        return tree
+
+
+class FlatNode():
+    # Visão de um nó da FlatTree. Duas visões do mesmo nó são iguais.
+
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, FlatNode) and self.tree is other.tree and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    def __repr__(self):
+        return 'FlatNode(%d: %r)' % (self.index, self.name)
+
+    @property
+    def name(self):
+        return self.tree.strings[self.tree.names[self.index]]
+
+    @property
+    def type(self):
+        return self.tree.string(self.tree.types[self.index])
+
+    @property
+    def line(self):
+        line = self.tree.lines[self.index]
+        return line if line != NONE else None
+
+    @property
+    def id(self):
+        return str(self.index) + ': ' + str(self.name)
+
+    @property
+    def children(self):
+        tree = self.tree
+        first = tree.first[self.index]
+        return tuple(FlatNode(tree, child) for child in range(first, first + tree.counts[self.index]))
+
+    @property
+    def parent(self):
+        parent = self.tree.parents[self.index]
+        return FlatNode(self.tree, parent) if parent != NONE else None
+
+    @property
+    def ancestors(self):
+        ancestors = []
+        parents = self.tree.parents
+        parent = parents[self.index]
+        while parent != NONE:
+            ancestors.append(FlatNode(self.tree, parent))
+            parent = parents[parent]
+        ancestors.reverse()
+        return tuple(ancestors)
+
+    anchestors = ancestors
+
+    @property
+    def is_leaf(self):
+        return self.tree.counts[self.index] == 0
+
+    @property
+    def is_root(self):
+        return self.index == 0
+
+    # Anotações: ausentes (AttributeError) até a análise semântica anotar.
+
+    def flag(self, bit):
+        flags = self.tree.flags[self.index]
+        if not flags & ANNOTATED:
+            raise AttributeError('nó não anotado')
+        return bool(flags & bit)
+
+    def setFlag(self, bit, value):
+        flags = self.tree.flags[self.index] | ANNOTATED
+        self.tree.flags[self.index] = flags | bit if value else flags & ~bit
+
+    @property
+    def scope(self):
+        scope = self.tree.scopes[self.index]
+        if scope == NONE:
+            raise AttributeError('nó não anotado')
+        return self.tree.strings[scope]
+
+    @scope.setter
+    def scope(self, scope):
+        self.tree.scopes[self.index] = self.tree.intern(scope)
+
+    @property
+    def inIndex(self):
+        return self.flag(IN_INDEX)
+
+    @inIndex.setter
+    def inIndex(self, value):
+        self.setFlag(IN_INDEX, value)
+
+    @property
+    def inArgument(self):
+        return self.flag(IN_ARGUMENT)
+
+    @inArgument.setter
+    def inArgument(self, value):
+        self.setFlag(IN_ARGUMENT, value)
+
+
+def flatten(root):
+    # Atalho: converte a árvore e retorna a raiz achatada.
+    return FlatTree.from_tree(root).root
@@ -0,0 +1,56 @@
+import pytest
+import tppparser
+import tppsema
+import tppflat
+from myerror import diagnostics
+from tppcompiler import Compilation
+
+source = open('tests/gencode-014.tpp').read()
+
+def preorder(node):
+    nodes = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        nodes.append((node.name, node.type, node.line, len(node.children)))
+        stack.extend(reversed(node.children))
+    return nodes
+
+def check(tree):
+    errors = []
+    token = diagnostics.set(errors)
+    try:
+        tppsema.reset(tree)
+        tppsema.checkRules(tree)
+    finally:
+        diagnostics.reset(token)
+    return errors
+
+def test_001():
+    # A árvore achatada tem os mesmos nós, na mesma ordem.
+    tree = tppparser.parse(source)
+    flat = tppflat.FlatTree.from_tree(tree)
+    assert preorder(flat.root) == preorder(tree)
+    assert len(flat) == len(preorder(tree))
+    assert flat.root.children[0].parent == flat.root
+
+def test_002():
+    # A análise semântica percorre a árvore achatada diretamente.
+    source = open('tests/gencode-009.tpp').read()
+    expected = check(tppparser.parse(source))
+    assert expected
+    assert check(tppflat.flatten(tppparser.parse(source))) == expected
+
+def test_003():
+    # A geração de código a partir da árvore achatada gera o mesmo módulo.
+    for path in ['tests/gencode-001.tpp', 'tests/gencode-014.tpp']:
+        assert Compilation.from_file(path, flat=True).run() == Compilation.from_file(path).run()
+
+def test_004():
+    # Formato binário: a árvore lida é igual à gravada.
+    flat = tppflat.FlatTree.from_tree(tppparser.parse(source))
+    loaded = tppflat.FlatTree.from_bytes(flat.to_bytes())
+    assert preorder(loaded.root) == preorder(flat.root)
+    assert loaded.strings == flat.strings
+    with pytest.raises(ValueError):
+        tppflat.FlatTree.from_bytes(flat.to_bytes()[:-1])
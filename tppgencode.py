@@ -1,37 +1,168 @@
 import os
 import sys
+import hashlib
 import logging
+import threading
 from sys import argv
-from myerror import MyError
+from myerror import MyError, report
 
+import tppcache
 from llvmlite import ir
 from llvmlite import binding as llvm
 
-logging.basicConfig(
-     level = logging.DEBUG,
-     filename = "gencode.log",
-     filemode = "w",
-     format = "%(filename)10s:%(lineno)4d:%(message)s"
-)
 log = logging.getLogger()
 error_handler = MyError('GenCodeErrors', showErrorMessage=True)
 root = None
+llvm_ready = False
+target_machines = {}
+target_lock = threading.Lock()
+
+# Precedência dos operadores binários, da menor para a maior (como na
+# gramática: lógicos, relacionais, aditivos e multiplicativos).
+PRECEDENCE = {
+    '&&': 1, '||': 1,
+    '<': 2, '>': 2, '=': 2, '<>': 2, '<=': 2, '>=': 2,
+    '+': 3, '-': 3,
+    '*': 4, '/': 4,
+    # Operadores unários (ver UNARY).
+    'neg': 5, 'not': 5, 'pos': 5,
+}
+UNARY = {'-': 'neg', '!': 'not', '+': 'pos'}
+
+
+def initializeLLVM():
+    # A inicialização do LLVM é feita uma única vez por processo.
+    global llvm_ready
+    with target_lock:
+        if not llvm_ready:
+            llvm.initialize()
+            llvm.initialize_all_targets()
+            llvm.initialize_native_target()
+            llvm.initialize_native_asmprinter()
+            llvm_ready = True
+
+
+def getTargetMachine(triple=None, opt=2, cpu='', features=''):
+    # Target machine para o alvo (padrão: o do processo), nível de
+    # otimização e CPU. Cada combinação é criada uma única vez por processo
+    # e reaproveitada por todas as instâncias de GenCode.
+    initializeLLVM()
+    key = (triple or llvm.get_process_triple(), opt, cpu, features)
+    with target_lock:
+        if key not in target_machines:
+            target = llvm.Target.from_triple(key[0])
+            target_machines[key] = target.create_target_machine(cpu=cpu, features=features, opt=opt)
+        return target_machines[key]
+
+
+# Otimização do módulo (-O0 a -O3): o texto IR é lido pelo LLVM
+# (llvm.parse_assembly) e passa pelo pipeline do PassManagerBuilder do nível,
+# que inclui mem2reg (SROA), instcombine, GVN, as passagens de laços (rotate,
+# LICM, unroll, deletion) e, a partir de -O2, inlining com o limiar do clang.
+# Cada módulo é lido em um contexto LLVM próprio, então compilações em
+# threads diferentes (tppserver) podem otimizar ao mesmo tempo.
+OPT_LEVELS = (0, 1, 2, 3)
+INLINE_THRESHOLD = {2: 225, 3: 275}
+
+
+def parseModule(code):
+    # Módulo do LLVM (llvm.ModuleRef) lido do texto IR e verificado, ou None
+    # se o LLVM rejeita o IR; nesse caso o erro é reportado.
+    try:
+        module = llvm.parse_assembly(code, context=llvm.create_context())
+        module.verify()
+    except RuntimeError as e:
+        report(error_handler.newError('ERR-GEN-INVALID-IR').format(str(e).strip()))
+        return None
+    return module
+
+
+def optimize(code, opt=2):
+    # Módulo do LLVM verificado e otimizado no nível opt, ou None se o IR é
+    # inválido (ver parseModule).
+    module = parseModule(code)
+    if module is None:
+        return None
+    if opt > 0:
+        builder = llvm.create_pass_manager_builder()
+        builder.opt_level = opt
+        if opt in INLINE_THRESHOLD:
+            builder.inlining_threshold = INLINE_THRESHOLD[opt]
+        builder.loop_vectorize = opt > 2
+        builder.slp_vectorize = opt > 2
+        passes = llvm.create_module_pass_manager()
+        getTargetMachine(opt=opt).add_analysis_passes(passes)
+        builder.populate(passes)
+        passes.run(module)
+    return module
+
+
+def emitObject(module, output, opt=2):
+    # Arquivo objeto do módulo já otimizado (llvm.ModuleRef ou texto IR): as
+    # passagens de otimização não são executadas de novo, só a geração de
+    # código da target machine do nível. Retorna False, sem gravar o arquivo,
+    # se o IR é inválido.
+    if isinstance(module, str):
+        module = parseModule(module)
+    if module is None:
+        return False
+    data = getTargetMachine(opt=opt).emit_object(module)
+    file = open(output, 'wb')
+    file.write(data)
+    file.close()
+    return True
+
+
+def codeSignature():
+    # Hash do gerador (este módulo, versão do llvmlite e alvo), parte da
+    # chave das funções na cache.
+    global signature
+    try:
+        return signature
+    except NameError:
+        pass
+    digest = hashlib.sha256()
+    with open(__file__, 'rb') as file:
+        digest.update(file.read())
+    digest.update(llvm.llvm_version_info.__repr__().encode())
+    digest.update(llvm.get_process_triple().encode())
+    digest.update(str(getTargetMachine().target_data).encode())
+    signature = digest.hexdigest()
+    return signature
+
+
+class CachedFunction(ir.Function):
+    # Função cuja definição (texto IR) veio da cache: o protótipo é declarado
+    # no módulo como o de uma função gerada e a definição é o texto salvo.
+
+    def __init__(self, module, ftype, name, definition):
+        super().__init__(module, ftype, name)
+        self.definition = definition
+
+    def descr(self, buf):
+        buf.append(self.definition)
+
+
+# Geração incremental (GenCode(incremental=True)): o IR de cada função é
+# guardado na cache (tppcache, 'ir') com a chave functionKey(): a subárvore
+# da declaração e, para cada nome usado nela, a variável global e a função
+# declaradas antes com esse nome (tipo ou assinatura), que é o que
+# getVar/getFunction encontram. Os nomes locais de uma função não dependem
+# do resto do módulo (cada ir.Function tem o seu escopo de nomes), então uma
+# função com a mesma chave gera o mesmo texto e só as funções alteradas (ou
+# que usam uma declaração alterada) são geradas novamente.
 
 
 class GenCode():
-    def __init__(self):
-        # Código de Inicialização.
-        llvm.initialize()
-        llvm.initialize_all_targets()
-        llvm.initialize_native_target()
-        llvm.initialize_native_asmprinter()
+    def __init__(self, incremental=False, target_machine=None, opt=0):
+        # Sem target_machine, a do processo (getTargetMachine()). opt é o
+        # nível de otimização do código gerado (code(), saveCode()).
+        self.target_machine = target_machine or getTargetMachine()
 
         # Cria o módulo.
         self.module = ir.Module('meu_modulo.bc')
-        self.module.triple = llvm.get_process_triple()
-        target = llvm.Target.from_triple(self.module.triple)
-        target_machine = target.create_target_machine()
-        self.module.data_layout = target_machine.target_data
+        self.module.triple = self.target_machine.triple
+        self.module.data_layout = self.target_machine.target_data
 
         # Define os tipos
         self.FLOAT = ir.FloatType()
@@ -59,22 +190,65 @@ class GenCode():
         # Declaração de parametros da função
         self.args_func = []
 
-    def declaration(self, tree):
+        # Geração incremental: tipo das globais e assinatura das funções já
+        # declaradas, por nome, e as funções geradas para gravar na cache.
+        self.incremental = incremental
+        self.signatures = {}
+        self.generated = []
+
+        self.opt = opt
+        self.optimized = None
+
+    def declaration(self, tree, output='meu_modulo.ll'):
         declaractions = tree.children[0].children
         for decl in declaractions:
             if decl.name == 'declaracao_funcao':
-                self.functionDeclaration(decl)
+                if self.incremental:
+                    self.incrementalFunction(decl)
+                else:
+                    self.functionDeclaration(decl)
             elif decl.name == 'declaracao_variaveis':
-                self.vars_global.extend(self.variableDeclaration(decl))
+                variables = self.variableDeclaration(decl)
+                self.vars_global.extend(variables)
+                for var in variables:
+                    self.signatures.setdefault(('var', var.name), str(var.type))
             else:
-                print('inicialização de variveis')
-        self.saveCode()
-
-    def functionDeclaration(self, tree):
-        # Reseta o lista de variaveis locais e argumentos
-        self.vars_local = []
-        self.args_func = []
+                report('inicialização de variveis')
+        if self.generated:
+            tppcache.store_entries('ir', [(key, str(func).encode()) for key, func in self.generated])
+            self.generated = []
+        if output:
+            self.saveCode(output)
+
+    def functionKey(self, tree):
+        digest = hashlib.sha256(codeSignature().encode())
+        names = set()
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            children = node.children
+            digest.update(('%s\0%s\0%d\0' % (node.name, node.type, len(children))).encode())
+            if children:
+                stack.extend(children)
+            else:
+                names.add(node.name)
+        for name in sorted(names, key=str):
+            for kind in ('var', 'function'):
+                signature = self.signatures.get((kind, name))
+                if signature:
+                    digest.update(('%s\0%s\0%s\0' % (kind, name, signature)).encode())
+        return digest.hexdigest()
+
+    def incrementalFunction(self, tree):
+        key = self.functionKey(tree)
+        definition = tppcache.load_entry('ir', key)
+        if definition is None:
+            self.generated.append((key, self.functionDeclaration(tree)))
+        else:
+            self.functionPrototype(tree, lambda module, type, name: CachedFunction(module, type, name, definition.decode()))
 
+    def functionPrototype(self, tree, function=ir.Function):
+        # Declara a função no módulo; retorna a função e o corpo a gerar.
         if tree.children[0].name in ['inteiro', 'flutuante']:
             name = tree.children[1].name
             params = tree.children[3]
@@ -94,13 +268,22 @@ class GenCode():
 
         # Declara a função
         func_type = ir.FunctionType(type, parameters['types'])
-        func = ir.Function(self.module, func_type, name)
+        func = function(self.module, func_type, name)
 
         for i in range(len(func.args)):
             func.args[i].name = parameters['names'][i]
 
         # Guarda a função declarada em uma array de funções
         self.functions.append(func)
+        self.signatures.setdefault(('function', func.name), str(func_type))
+        return func, body
+
+    def functionDeclaration(self, tree):
+        # Reseta o lista de variaveis locais e argumentos
+        self.vars_local = []
+        self.args_func = []
+
+        func, body = self.functionPrototype(tree)
 
         # Guarda os argumentos da função em array global
         self.args_func = func.args
@@ -113,6 +296,7 @@ class GenCode():
 
         # Realisa as operações do corpo
         self.body(body, func)
+        return func
 
     def variableDeclaration(self, tree, isGlobal=True):
         variables = tree.children[2].children
@@ -235,11 +419,12 @@ class GenCode():
                 ifend = func.append_basic_block('ifend')
                 self.block.branch(ifend)
 
-            # Senão
+            # Senão: os dois ramos desviam para o mesmo ifend.
             self.block.position_at_end(iffalse)
             hasReturn = self.body(tree.children[5], func)
             if not hasReturn:
-                ifend = func.append_basic_block('ifend')
+                if ifend == None:
+                    ifend = func.append_basic_block('ifend')
                 self.block.branch(ifend)
 
             if ifend != None:
@@ -301,68 +486,82 @@ class GenCode():
         return ret 
     
     def expression(self, tree):
-        aux = tree.children
-        arg1 = None
-        arg2 = None
-        index = 0 if aux[0].name != '(' else 1
-
-        name = aux[index].name
-        if aux[index].name == 'chamada_funcao':
-            arg1 = self.callFunction(aux[index])
+        # A expressão podada é a sequência infixa de operandos, operadores e
+        # parênteses. É avaliada com uma pilha de valores e uma de operadores
+        # (precedência da gramática, associativos à esquerda), sem recursão
+        # por termo ou por nível de precedência.
+        values = []
+        operators = []
+        operand = True
+        for node in tree.children:
+            name = node.name
+            if operand:
+                if name == '(':
+                    operators.append(name)
+                elif name in UNARY:
+                    operators.append(UNARY[name])
+                else:
+                    values.append(self.operand(node))
+                    operand = False
+            elif name == ')':
+                while operators[-1] != '(':
+                    self.reduce(values, operators)
+                operators.pop()
+            else:
+                while operators and operators[-1] != '(' and PRECEDENCE[operators[-1]] >= PRECEDENCE[name]:
+                    self.reduce(values, operators)
+                operators.append(name)
+                operand = True
+        while operators:
+            self.reduce(values, operators)
+        return values[-1] if values else None
+
+    def operand(self, node):
+        name = node.name
+        if name == 'chamada_funcao':
+            return self.callFunction(node)
         elif name == 'var':
-            res = self.getVar(aux[index].children[0].name)
+            res = self.getVar(node.children[0].name)
             if res == None:
-                res = self.getArgs(aux[index].children[0].name)
-                arg1 = res
-            else:
-                if len(aux[index].children) > 1:
-                    index_array = self.expression(aux[index].children[1].children[1])
-                    array_1 = self.block.gep(res, [self.INT(0), index_array], name='array_1')
-                    res = array_1
-                arg1 = self.block.load(res)
+                return self.getArgs(node.children[0].name)
+            if len(node.children) > 1:
+                index_array = self.expression(node.children[1].children[1])
+                array_1 = self.block.gep(res, [self.INT(0), index_array], name='array_1')
+                res = array_1
+            return self.block.load(res)
         elif 'NUM_' in name:
-            val_aux = aux[index].children[0].name
+            val_aux = node.children[0].name
             if val_aux in ['0']:
-                arg1 = self.ZERO
-            else:
-                type_aux = self.getType(name)
-                val_aux = float(val_aux) if type_aux == self.FLOAT else int(val_aux)
-                arg1 = ir.Constant(type_aux, val_aux)
-        
-        if len(tree.children) > 1:
-            name = aux[index+2].name
-            if aux[index+2].name == 'chamada_funcao':
-                arg2 = self.callFunction(aux[index+2])
-            elif name == 'var':
-                res = self.getVar(aux[index+2].children[0].name)
-                if res == None:
-                    res = self.getArgs(aux[index+2].children[0].name)
-                    arg2 = res
-                else:
-                    if len(aux[index+2].children) > 1:
-                        index_array = self.expression(aux[index+2].children[1].children[1])
-                        array_1 = self.block.gep(res, [self.INT(0), index_array], name='array_1')
-                        res = array_1
-                    arg2 = self.block.load(res)
-            elif 'NUM_' in name:
-                val_aux = aux[index+2].children[0].name
-                if val_aux in ['0']:
-                    arg2 = self.ZERO
-                else:
-                    type_aux = self.getType(name)
-                    val_aux = float(val_aux) if type_aux == self.FLOAT else int(val_aux)
-                    arg2 = ir.Constant(type_aux, val_aux)
-            else:
-                arg2 = self.expression(aux[index+2])
-
-            operator = aux[index+1].name          
-            if(operator == "+"): return self.block.add(arg1, arg2, name='summ')
-            elif(operator == "-"): return self.block.sub(arg1, arg2, name='sub')
-            elif(operator == "*"): return self.block.mul(arg1, arg2, name='mult')
-            elif(operator == "/"): return self.block.sdiv(arg1, arg2, name='div')
-            elif(operator in ["<",">","=",">=","<=","&&","||"]): 
-                operator = "==" if operator == '=' else operator
-                return self.block.icmp_signed(operator, arg1, arg2, name='se_entao')
+                return self.ZERO
+            type_aux = self.getType(name)
+            val_aux = float(val_aux) if type_aux == self.FLOAT else int(val_aux)
+            return ir.Constant(type_aux, val_aux)
+        return None
+
+    def reduce(self, values, operators):
+        # Aplica o operador do topo da pilha aos últimos valores.
+        operator = operators.pop()
+        arg2 = values.pop()
+        if operator == 'neg':
+            values.append(self.block.neg(arg2, name='neg'))
+        elif operator == 'not':
+            values.append(self.block.not_(arg2, name='nao'))
+        elif operator == 'pos':
+            values.append(arg2)
+        else:
+            arg1 = values.pop()
+            values.append(self.operation(operator, arg1, arg2))
+
+    def operation(self, operator, arg1, arg2):
+        if(operator == "+"): return self.block.add(arg1, arg2, name='summ')
+        elif(operator == "-"): return self.block.sub(arg1, arg2, name='sub')
+        elif(operator == "*"): return self.block.mul(arg1, arg2, name='mult')
+        elif(operator == "/"): return self.block.sdiv(arg1, arg2, name='div')
+        elif(operator == "&&"): return self.block.and_(arg1, arg2, name='e')
+        elif(operator == "||"): return self.block.or_(arg1, arg2, name='ou')
+        elif(operator in ["<",">","=","<>",">=","<="]):
+            operator = {'=': '==', '<>': '!='}.get(operator, operator)
+            return self.block.icmp_signed(operator, arg1, arg2, name='se_entao')
         return arg1
 
     def getType(self, type_name):
@@ -391,12 +590,33 @@ class GenCode():
                 return varLocal
         return None
 
-    def saveCode(self):
-        file = open('meu_modulo.ll', 'w')
-        file.write(str(self.module))
+    def code(self):
+        # Texto IR do módulo, otimizado se opt > 0; None se o LLVM rejeitou o
+        # IR (o erro é reportado uma única vez). O pipeline de otimização é
+        # executado uma única vez e só o texto é guardado: um ModuleRef
+        # preso em um ciclo do coletor pode ser liberado depois do seu
+        # contexto LLVM.
+        if self.opt == 0:
+            return str(self.module)
+        if self.optimized is None:
+            module = optimize(str(self.module), self.opt)
+            self.optimized = str(module) if module is not None else False
+        return self.optimized if self.optimized is not False else None
+
+    def saveCode(self, output='meu_modulo.ll'):
+        # Gera o texto antes de abrir o arquivo para não deixar um .ll vazio
+        # caso a geração falhe.
+        code = self.code()
+        if code is None:
+            return
+        file = open(output, 'w')
+        file.write(code)
         file.close()
         # print(self.module)
 
+    def saveObject(self, output='meu_modulo.o'):
+        return emitObject(self.code(), output, self.opt)
+
 def main():
     if(len(sys.argv) < 2):
         raise TypeError(error_handler.newError('ERR-SEM-USE'))
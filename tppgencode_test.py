@@ -85,3 +85,132 @@ def test_019():
 
 def test_020():
     assert execute_test("gencode-020.tpp") == True
+
+def operations(code):
+    # Instruções aritméticas, lógicas e de comparação do IR, na ordem.
+    names = ['add', 'sub', 'mul', 'sdiv', 'and', 'or', 'icmp']
+    words = [line.split() for line in code.splitlines()]
+    return [word[2] for word in words if len(word) > 2 and word[1] == '=' and word[2] in names]
+
+def test_021():
+    # Expressões longas são podadas e geradas sem recursão, nas duas árvores.
+    import sys
+    from tppcompiler import Compilation
+    terms = sys.getrecursionlimit() * 3
+    source = 'inteiro principal()\n  inteiro: a\n  a := 1\n  retorna(' + ' + '.join(['a'] * terms) + ')\nfim\n'
+    for direct in [False, True]:
+        code = Compilation(source, direct=direct).run()
+        assert operations(code).count('add') == terms - 1
+
+def test_022():
+    # Precedência, parênteses e operadores lógicos.
+    from tppcompiler import Compilation
+    code = Compilation('inteiro principal()\n  inteiro: a\n  a := 1\n'
+                       '  se (a > 1) && (a < 5) então\n    a := (a + 2) * 3 - a / 2\n  fim\n'
+                       '  retorna(a)\nfim\n').run()
+    assert operations(code) == ['icmp', 'icmp', 'and', 'add', 'mul', 'sdiv', 'sub']
+
+def test_023(tmp_path, monkeypatch):
+    # Geração incremental: só as funções alteradas (ou que usam uma
+    # declaração alterada) são geradas de novo, e o módulo é o mesmo.
+    from tppcompiler import Compilation
+    from tppgencode import CachedFunction
+    monkeypatch.setenv('TPP_CACHE_DIR', str(tmp_path))
+    program = ('inteiro: g\n{globais}'
+               'inteiro f(inteiro: a)\n  retorna(a + g)\nfim\n'
+               'inteiro h(inteiro: b)\n  retorna(b * {k})\nfim\n'
+               'inteiro principal()\n  escreva(f(1) + h(2))\n  retorna(0)\nfim\n')
+    cases = [('', 2, []), ('', 2, ['f', 'h', 'main']), ('', 3, ['f', 'main']),
+             ('inteiro: z\n', 3, ['f', 'h', 'main']), ('inteiro: a\n', 3, ['h', 'main'])]
+    for globals, k, cached in cases:
+        source = program.replace('{globais}', globals).replace('{k}', str(k))
+        compilation = Compilation(source, incremental=True)
+        assert compilation.run() == Compilation(source).run()
+        assert [func.name for func in compilation.gencode.functions if isinstance(func, CachedFunction)] == cached
+
+def test_024():
+    # Uma target machine por alvo, nível de otimização e CPU, criada uma vez
+    # e reaproveitada pelos geradores.
+    from tppgencode import GenCode, getTargetMachine
+    machine = getTargetMachine()
+    assert getTargetMachine() is machine
+    assert getTargetMachine(opt=0) is not machine
+    assert getTargetMachine(opt=0) is getTargetMachine(opt=0)
+    assert GenCode().target_machine is machine
+    gencode = GenCode(target_machine=getTargetMachine(opt=0))
+    assert gencode.target_machine is getTargetMachine(opt=0)
+    assert gencode.module.triple == machine.triple
+
+def test_025():
+    # Níveis de otimização: o módulo otimizado é válido, as variáveis locais
+    # vão para registradores e o programa retorna o mesmo valor.
+    import ctypes
+    from llvmlite import binding as llvm
+    from tppcompiler import Compilation
+    from tppgencode import OPT_LEVELS
+    source = ('inteiro: a\n'
+              'inteiro soma(inteiro: x, inteiro: y)\n  retorna(x + y)\nfim\n'
+              'inteiro principal()\n  inteiro: b, i\n  a := 10\n  b := 0\n  i := 0\n'
+              '  repita\n    b := soma(b, a)\n    i := i + 1\n  até i = 5\n  retorna(b)\nfim\n')
+    for opt in OPT_LEVELS:
+        code = Compilation(source, opt=opt).run()
+        assert ('alloca' in code) == (opt == 0)
+        module = llvm.parse_assembly(code)
+        # A engine fica com a target machine: não é a da cache.
+        engine = llvm.create_mcjit_compiler(module, llvm.Target.from_default_triple().create_target_machine())
+        engine.finalize_object()
+        main = ctypes.CFUNCTYPE(ctypes.c_int32)(engine.get_function_address('main'))
+        assert main() == 50
+
+def test_026(tmp_path, monkeypatch):
+    # O pipeline de otimização executa uma única vez por módulo, gravando o
+    # IR e o objeto.
+    import tppgencode
+    import tppparser
+    calls = []
+    optimize = tppgencode.optimize
+    monkeypatch.setattr(tppgencode, 'optimize', lambda code, opt: calls.append(opt) or optimize(code, opt))
+    tree = tppparser.parse(open('tests/gencode-014.tpp').read(), direct=True)
+    gencode = tppgencode.GenCode(opt=2)
+    gencode.declaration(tree, output=str(tmp_path / 'a.ll'))
+    gencode.saveObject(str(tmp_path / 'a.o'))
+    tppgencode.emitObject(gencode.code(), str(tmp_path / 'b.o'), 2)
+    assert calls == [2]
+    assert open(tmp_path / 'a.o', 'rb').read() == open(tmp_path / 'b.o', 'rb').read()
+
+def test_027():
+    # Operadores unários na árvore podada e na árvore direta.
+    import ctypes
+    from llvmlite import binding as llvm
+    from tppcompiler import Compilation
+    source = ('inteiro principal()\n  inteiro: a, b, c\n  a := 3\n  b := -a\n  c := -(a + 1) * 2\n'
+              '  se !(a > 1) então\n    b := 0\n  fim\n  retorna(b + c)\nfim\n')
+    codes = [Compilation(source, direct=direct).run() for direct in [False, True]]
+    assert codes[0] == codes[1]
+    engine = llvm.create_mcjit_compiler(llvm.parse_assembly(codes[0]),
+                                        llvm.Target.from_default_triple().create_target_machine())
+    engine.finalize_object()
+    main = ctypes.CFUNCTYPE(ctypes.c_int32)(engine.get_function_address('main'))
+    assert main() == -11
+
+def test_028(tmp_path):
+    # Se/senão sem retorno nos dois ramos: um único ifend, e o IR é aceito
+    # pelo LLVM em todos os níveis. IR inválido vira mensagem, não exceção.
+    import myerror
+    import tppgencode
+    from tppcompiler import Compilation
+    for name in ['tests/gencode-002.tpp', 'tests/gencode-003.tpp', 'tests/gencode-011.tpp']:
+        for opt in tppgencode.OPT_LEVELS:
+            compilation = Compilation.from_file(name, opt=opt)
+            assert compilation.run() != None
+            assert tppgencode.emitObject(str(compilation.gencode.module), str(tmp_path / 'a.o'), opt)
+    invalid = 'define i32 @f() {\nentry:\n  br label %fim\nfim:\n}\n'
+    errors = []
+    token = myerror.diagnostics.set(errors)
+    try:
+        assert tppgencode.optimize(invalid, 2) is None
+        assert not tppgencode.emitObject(invalid, str(tmp_path / 'b.o'), 0)
+    finally:
+        myerror.diagnostics.reset(token)
+    assert len(errors) == 2 and errors[0].startswith('Erro: O LLVM rejeitou')
+    assert not os.path.exists(tmp_path / 'b.o')
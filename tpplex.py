@@ -1,18 +1,21 @@
 from ply.lex import TOKEN
 import ply.lex as lex
-from sys import argv, exit
-from myerror import MyError
+from sys import argv, exit, intern
+import io
+import os
+import re
+import mmap
+import bisect
+import itertools
+import threading
+from myerror import MyError, report
 
 import logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    filename="lex.log",
-    filemode="w",
-    format="%(filename)10s:%(lineno)4d:%(message)s"
-)
+# O log só é gravado quando solicitado (ver main.py --log).
 log = logging.getLogger()
 
 le = MyError('LexerErrors')
+build_lock = threading.Lock()
 
 tokens = [
     "ID",  # identificador
@@ -66,29 +69,36 @@ digito = r"([0-9])"
 letra = r"([a-zA-ZáÁãÃàÀéÉíÍóÓõÕ])"
 sinal = r"([\-\+]?)"
 
+# As expressões usadas nas regras não têm grupos de captura (o PLY junta
+# todas as regras em uma única expressão, e cada grupo tem custo em cada
+# casamento) nem alternativas que voltam a ler os mesmos caracteres.
+
 """ 
     id deve começar com uma letra
 """
-id = (
-    r"(" + letra + r"(" + digito + r"+|_|" + letra + r")*)"
-)  # o mesmo que '((letra)(letra|_|([0-9]))*)'
+id = r"[a-zA-ZáÁãÃàÀéÉíÍóÓõÕ][a-zA-ZáÁãÃàÀéÉíÍóÓõÕ0-9_]*"
+# o mesmo que '((letra)(letra|_|([0-9]))*)'
 
 # inteiro = r"(" + sinal + digito + r"+)"
 # inteiro = r"(" + digito + r"+)"
-inteiro = r"\d+"
+inteiro = r"[0-9]+"
 
 flutuante = (
     # r"(" + digito + r"+\." + digito + r"+?)"
     # (([-\+]?)([0-9]+)\.([0-9]+))'
-    r'\d+[eE][-+]?\d+|(\.\d+|\d+\.\d*)([eE][-+]?\d+)?'
+    # r'\d+[eE][-+]?\d+|(\.\d+|\d+\.\d*)([eE][-+]?\d+)?'
+    # Mesma linguagem, com a parte inteira lida uma única vez:
+    r'\.[0-9]+(?:[eE][-+]?[0-9]+)?|[0-9]+(?:[eE][-+]?[0-9]+|\.[0-9]*(?:[eE][-+]?[0-9]+)?)'
     # r'[-+]?[0-9]+(\.([0-9]+)?)'
     #r'[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?'
     #r"(([-\+]?)([0-9]+)\.([0-9]+))"
 )
 
-notacao_cientifica = (
-    r"(" + sinal + r"([1-9])\." + digito + r"+[eE]" + sinal + digito + r"+)"
-)  # o mesmo que '(([-\+]?)([1-9])\.([0-9])+[eE]([-\+]?)([0-9]+))'
+notacao_cientifica = r"[-+]?[1-9]\.[0-9]+[eE][-+]?[0-9]+"
+# o mesmo que '(([-\+]?)([1-9])\.([0-9])+[eE]([-\+]?)([0-9]+))'
+
+# Os dígitos são [0-9], e não \d: sobre str, \d também aceita dígitos de
+# outros alfabetos, e sobre bytes (tppscan com mmap) só os ASCII.
 
 # Expressões Regulaes para tokens simples.
 # Símbolos.
@@ -117,10 +127,21 @@ t_MENOR = r'<'
 t_MAIOR = r'>'
 t_IGUAL = r'='
 
+# As regras definidas por funções são tentadas na ordem em que aparecem
+# (antes das regras de símbolos): primeiro as mais frequentes. Os números
+# precisam ficar na ordem notação científica, ponto flutuante, inteiro.
+
+reserved_type = reserved_words.get
+
+# Os valores dos ids e números são internados (sys.intern): cada nome ou
+# número repetido no código é um único objeto str, compartilhado pelos
+# tokens e nós da árvore, e as comparações e buscas na tabela de símbolos
+# terminam na comparação de identidade.
 
 @TOKEN(id)
 def t_ID(token):
-    token.type = reserved_words.get(token.value, "ID")
+    token.value = intern(token.value)
+    token.type = reserved_type(token.value, "ID")
     # não é necessário fazer regras/regex para cada palavra reservada
     # se o token não for uma palavra reservada automaticamente é um id
     # As palavras reservadas têm precedências sobre os ids
@@ -128,18 +149,26 @@ def t_ID(token):
     return token
 
 
+def t_newline(token):
+    r"\n+"
+    token.lexer.lineno += len(token.value)
+
+
 @TOKEN(notacao_cientifica)
 def t_NUM_NOTACAO_CIENTIFICA(token):
+    token.value = intern(token.value)
     return token
 
 
 @TOKEN(flutuante)
 def t_NUM_PONTO_FLUTUANTE(token):
+    token.value = intern(token.value)
     return token
 
 
 @TOKEN(inteiro)
 def t_NUM_INTEIRO(token):
+    token.value = intern(token.value)
     return token
 
 
@@ -148,30 +177,76 @@ t_ignore = " \t"
 
 # t_COMENTARIO = r'(\{((.|\n)*?)\})'
 # para poder contar as quebras de linha dentro dos comentarios
+# Sem alternativas dentro da repetição: um '{' sem '}' é lido uma única vez
+# até o fim da entrada, sem retrocesso caractere a caractere.
 def t_COMENTARIO(token):
-    r"(\{((.|\n)*?)\})"
+    r"\{[^}]*\}"
     token.lexer.lineno += token.value.count("\n")
     # return token
 
 
-def t_newline(token):
-    r"\n+"
-    token.lexer.lineno += len(token.value)
-
-
-def define_column(input, lexpos):
-    line_start = input.rfind("\n", 0, lexpos) + 1
-    return (lexpos - line_start) + 1
+# Bytes que iniciam um caractere em UTF-8 (todos menos 10xxxxxx).
+UTF8_LEADING = bytes(byte for byte in range(256) if byte & 0xC0 != 0x80)
+
+
+class LineIndex():
+    # Posição de início de cada linha do código. É montada uma vez por
+    # entrada e a coluna de cada mensagem sai de uma busca binária, em vez de
+    # procurar o '\n' anterior ao token a cada erro.
+    #
+    # Se a entrada é binária (arquivo mapeado na memória), as posições são em
+    # bytes e a coluna conta os caracteres do início da linha até o token: os
+    # bytes que não são de continuação do UTF-8. A contagem continua da
+    # última consulta (last) se ela foi na mesma linha, antes do token, então
+    # as mensagens de uma linha longa não contam a linha de novo cada uma.
+    __slots__ = ('data', 'starts', 'binary', 'last')
+
+    def __init__(self, data):
+        self.data = data
+        self.binary = not isinstance(data, str)
+        self.last = (0, 0)
+        if self.binary:
+            self.starts = [0] + [match.end() for match in re.finditer(b"\n", data)]
+        else:
+            self.starts = list(itertools.accumulate((len(line) + 1 for line in data.split("\n")), initial=0))
+
+    def line(self, lexpos):
+        return bisect.bisect_right(self.starts, lexpos)
+
+    def column(self, lexpos):
+        start = self.starts[self.line(lexpos) - 1]
+        if not self.binary:
+            return lexpos - start + 1
+        position, count = self.last
+        if not start <= position <= lexpos:
+            position, count = start, 0
+        chunk = self.data[position:lexpos]
+        count += len(chunk) - len(chunk.translate(None, UTF8_LEADING))
+        self.last = (lexpos, count)
+        return count + 1
+
+
+def line_index(lexer):
+    # O índice fica no lexer (do PLY ou tppscan) e vale enquanto a entrada
+    # for a mesma; o lexer e o parser usam o mesmo índice.
+    index = getattr(lexer, 'line_index', None)
+    if index is None or index.data is not lexer.lexdata:
+        index = lexer.line_index = LineIndex(lexer.lexdata)
+    return index
+
+
+def define_column(token):
+    return line_index(token.lexer).column(token.lexpos)
 
 
 def t_error(token):
     # line = token.lineno
-    # column = define_column(token.lexer.lexdata, token.lexpos)
+    # column = define_column(token)
     
     message_error = le.newError('ERR-LEX-INV-CHAR', valor=token.value[0])
     # message_error = f"ERRO:[{line},{column}]: {message_error}."
     
-    print(message_error)
+    report(message_error)
 
     token.lexer.skip(1)
 
@@ -187,36 +262,147 @@ def main():
     aux = argv[1].split('.')
     if aux[-1] != 'tpp':
       raise IOError(le.newError('ERR-LEX-NOT-TPP'))
-    data = open(argv[1])
-
-    source_file = data.read()
-    lexer.input(source_file)
 
     # Tokenize
-    while True:
-      tok = lexer.token()
-      if not tok:
-        break      # No more input
+    for tok in iter_tokens(argv[1]):
+      pass
       # print(tok.type)
 
 def test(pdata):
-  data = open(pdata)
-  source_file = data.read()
-  lexer.input(source_file)
-
-  s = ""
-
-  while True:
-    tok = lexer.token()
-    if not tok:
-      break      # No more input
-    s += str(tok.type) + '\n'
-
-  return s
+  output = io.StringIO()
+  dump_tokens(pdata, output)
+  return output.getvalue()
+
+
+# Leitura do código em pedaços: nenhum token atravessa uma quebra de linha,
+# exceto o comentário, então cada pedaço termina em '\n' e fora de um
+# comentário aberto. O lexer analisa um pedaço por vez e o código inteiro
+# não precisa ficar na memória.
+CHUNK_SIZE = 1 << 20
+
+def comment_open(text, opened, start=0, end=None):
+    # Se há um comentário aberto no fim de text[start:end]: um '{' depois do
+    # último '}' começa um comentário que termina mais adiante.
+    close = text.rfind('}', start, end)
+    open = text.rfind('{', start, end)
+    if close < 0 and open < 0:
+        return opened
+    return open > close
+
+
+def read_chunks(source, size=None):
+    # source é o caminho do arquivo ou um arquivo de texto já aberto.
+    size = size or CHUNK_SIZE
+    file = open(source) if isinstance(source, str) else source
+    try:
+        pending = []
+        opened = False
+        while True:
+            data = file.read(size)
+            if not data:
+                break
+            # Corta o bloco depois do último '\n', se ali não houver um
+            # comentário aberto; o resto vai para o próximo pedaço.
+            cut = data.rfind('\n') + 1
+            inside = comment_open(data, opened, 0, cut)
+            if cut and not inside:
+                pending.append(data[:cut])
+                yield ''.join(pending)
+                pending = [data[cut:]]
+            else:
+                pending.append(data)
+            opened = comment_open(data, inside, cut)
+        rest = ''.join(pending)
+        if rest:
+            yield rest
+    finally:
+        if file is not source:
+            file.close()
+
+
+class TokenStream():
+    # Tokens do arquivo gerados sob demanda, com a interface de lexer que o
+    # parser usa (token() e lineno). O lexpos de cada token é relativo ao
+    # pedaço do código em que ele está (lexdata), que começa no início de uma
+    # linha; lineno é o do arquivo. Com kind='mmap' o arquivo é mapeado na
+    # memória e analisado de uma vez, sem pedaços.
+
+    def __init__(self, source, kind='ply'):
+        self.lexer = new_lexer(kind)
+        self.tokens = self.scan(source, kind)
+
+    def scan(self, source, kind):
+        if kind == 'mmap' and isinstance(source, str):
+            chunks = [map_file(source)]
+        else:
+            chunks = read_chunks(source)
+        for chunk in chunks:
+            self.lexer.input(chunk)
+            yield from iter(self.lexer.token, None)
+
+    def token(self):
+        return next(self.tokens, None)
+
+    def __iter__(self):
+        return self.tokens
+
+    @property
+    def lineno(self):
+        return self.lexer.lineno
+
+    @property
+    def lexdata(self):
+        return self.lexer.lexdata
+
+
+def iter_tokens(source, kind='ply'):
+    return iter(TokenStream(source, kind))
+
+
+def dump_tokens(source, output, kind='ply'):
+    # Escreve o tipo de cada token, um por linha, sem montar a saída inteira
+    # na memória (output é um arquivo com buffer ou io.StringIO).
+    output.writelines(tok.type + '\n' for tok in iter_tokens(source, kind))
 
 
 # Build the lexer.
-lexer = lex.lex(optimize=True, debug=True, debuglog=log)
+# O lexer é construído no primeiro uso, e não na importação do módulo.
+def get_lexer():
+    global lexer
+    with build_lock:
+        try:
+            return lexer
+        except NameError:
+            lexer = lex.lex(optimize=True, debug=log.isEnabledFor(logging.DEBUG), debuglog=log)
+            return lexer
+
+# Implementações do lexer: ply.lex ou o scanner de uma expressão (tppscan).
+# mmap é o scanner sobre o arquivo mapeado na memória (map_file), sem ler e
+# decodificar o arquivo inteiro; sobre um código já em memória é o regex.
+LEXERS = ('ply', 'regex', 'mmap')
+
+def new_lexer(kind='ply'):
+    # Cópia independente do lexer (posição e linha próprias) para uma compilação.
+    if kind in ('regex', 'mmap'):
+        import tppscan
+        return tppscan.new_scanner()
+    lexer = get_lexer().clone()
+    lexer.lineno = 1
+    return lexer
+
+def map_file(path):
+    # Conteúdo do arquivo mapeado na memória (somente leitura), em bytes. O
+    # mapeamento é desfeito quando o objeto deixa de ser usado.
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def __getattr__(name):
+    # Mantém o acesso a tpplex.lexer funcionando para quem importa o módulo.
+    if name == 'lexer':
+        return get_lexer()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 if __name__ == "__main__":
     main()
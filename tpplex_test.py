@@ -1,6 +1,10 @@
 import tpplex
 import subprocess
 import os, fnmatch
+import io
+import re
+import random
+import itertools
 
 def execute_test(input_file):
     path_file = 'tests/' + input_file
@@ -121,3 +125,107 @@ def test_031():
 
 def test_032():
     assert execute_test("verif_num_negativo.tpp") == True
+
+def tokens(source):
+    from myerror import diagnostics
+    errors = []
+    token = diagnostics.set(errors)
+    try:
+        lexer = tpplex.new_lexer()
+        lexer.input(source)
+        result = [(tok.type, tok.value, tok.lineno) for tok in iter(lexer.token, None)]
+    finally:
+        diagnostics.reset(token)
+    return result, errors
+
+def test_033():
+    # Números, identificadores com acento e comentários de várias linhas.
+    result, errors = tokens('então x_1 := -1.5e3 + 2.e1 + .5 + 3E2 + 4. + 7\n{ a\n b }\nfim')
+    assert [(type, value) for type, value, line in result] == [
+        ('ENTAO', 'então'), ('ID', 'x_1'), ('ATRIBUICAO', ':='),
+        ('NUM_NOTACAO_CIENTIFICA', '-1.5e3'), ('MAIS', '+'),
+        ('NUM_PONTO_FLUTUANTE', '2.e1'), ('MAIS', '+'),
+        ('NUM_PONTO_FLUTUANTE', '.5'), ('MAIS', '+'),
+        ('NUM_PONTO_FLUTUANTE', '3E2'), ('MAIS', '+'),
+        ('NUM_PONTO_FLUTUANTE', '4.'), ('MAIS', '+'),
+        ('NUM_INTEIRO', '7'), ('FIM', 'fim')]
+    assert result[-1][2] == 4
+    assert errors == []
+
+def test_034():
+    # Um '{' sem fechamento é um caractere inválido; o resto é analisado.
+    result, errors = tokens('{ x := 1\n' * 2000)
+    assert len(errors) == 2000
+    assert result[:3] == [('ID', 'x', 1), ('ATRIBUICAO', ':=', 1), ('NUM_INTEIRO', '1', 1)]
+    assert len(result) == 3 * 2000
+
+def test_035():
+    # A coluna pelo índice de linhas é a mesma de procurar o '\n' anterior.
+    data = '\nab\n\n  x \r\n\ty\nz'
+    index = tpplex.LineIndex(data)
+    for lexpos in range(len(data) + 1):
+        assert index.column(lexpos) == lexpos - (data.rfind('\n', 0, lexpos) + 1) + 1
+        assert index.line(lexpos) == data.count('\n', 0, lexpos) + 1
+
+def test_036(monkeypatch):
+    # Em pedaços pequenos, os tokens (e linhas) são os da entrada inteira.
+    monkeypatch.setattr(tpplex, 'CHUNK_SIZE', 16)
+    source = 'inteiro: a\n{ comentário\n de { várias\n\n linhas }\na := 1.5e3 {x} {\n\n'
+    chunks = list(tpplex.read_chunks(io.StringIO(source)))
+    assert ''.join(chunks) == source and len(chunks) > 1
+    assert chunks[1] == '{ comentário\n de { várias\n\n linhas }\n'
+    # Nenhum corte dentro de um comentário.
+    rand = random.Random(1)
+    for _ in range(500):
+        source = ''.join(rand.choice('{}\na ') for _ in range(rand.randrange(60)))
+        chunks = list(tpplex.read_chunks(io.StringIO(source), rand.randrange(1, 8)))
+        assert ''.join(chunks) == source
+        for end in itertools.accumulate(map(len, chunks[:-1])):
+            assert source[end - 1] == '\n' and not re.search(r'\{[^}]*$', source[:end])
+    for path in ['tests/gencode-001.tpp', 'tests/gencode-014.tpp', 'tests/gencode-012.tpp']:
+        for kind in tpplex.LEXERS:
+            lexer = tpplex.new_lexer(kind)
+            lexer.input(open(path).read())
+            expected = [(tok.type, tok.value, tok.lineno) for tok in iter(lexer.token, None)]
+            assert [(tok.type, tok.value, tok.lineno) for tok in tpplex.iter_tokens(path, kind)] == expected
+
+def test_037():
+    # Saída do dump de tokens: um tipo por linha.
+    assert tpplex.test('tests/gencode-013.tpp') == ''.join(
+        type + '\n' for type, value, line in tokens(open('tests/gencode-013.tpp').read())[0])
+
+def test_038():
+    # Ids e números repetidos são o mesmo objeto str, nos três lexers.
+    source = ''.join(['contador := contador + 10', '\n', 'total := contador * 10'])
+    for kind in tpplex.LEXERS:
+        lexer = tpplex.new_lexer(kind)
+        lexer.input(source.encode() if kind == 'mmap' else source)
+        values = {}
+        for tok in iter(lexer.token, None):
+            if tok.type in ('ID', 'NUM_INTEIRO'):
+                assert values.setdefault(tok.value, tok.value) is tok.value
+        assert len(values) == 3
+
+def test_039():
+    # Colunas sobre bytes em UTF-8: as mesmas do texto, em qualquer ordem de
+    # consulta, também numa linha longa com letras acentuadas.
+    data = 'é\n' + 'índice := ótimo + a ' * 200 + '\nfim'
+    encoded = data.encode()
+    text = tpplex.LineIndex(data)
+    binary = tpplex.LineIndex(encoded)
+    positions = [len(data[:k].encode()) for k in range(len(data) + 1)]
+    order = list(range(len(positions)))
+    random.Random(1).shuffle(order)
+    for k in list(range(len(positions))) + order:
+        assert binary.column(positions[k]) == text.column(k)
+
+def test_040():
+    # Só os dígitos ASCII formam números, nos três lexers ('٣' é inválido).
+    source = 'a := 1٣ + 2.5\n'
+    results = []
+    for kind in tpplex.LEXERS:
+        lexer = tpplex.new_lexer(kind)
+        lexer.input(source.encode() if kind == 'mmap' else source)
+        results.append([(tok.type, tok.value) for tok in iter(lexer.token, None)])
+    assert results[0] == results[1] == results[2]
+    assert ('NUM_INTEIRO', '1') in results[0] and ('NUM_PONTO_FLUTUANTE', '2.5') in results[0]
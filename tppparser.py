@@ -1,25 +1,37 @@
 import os
+import copy
+import hashlib
+import threading
 from sys import argv
 import logging
 
-logging.basicConfig(
-     level = logging.DEBUG,
-     filename = "parser.log",
-     filemode = "w",
-     format = "%(filename)10s:%(lineno)4d:%(message)s"
-)
 log = logging.getLogger()
 
+# O arquivo de log só é criado quando solicitado (ver main.py --log).
+def setup_log():
+    logging.basicConfig(
+         level = logging.DEBUG,
+         filename = "parser.log",
+         filemode = "w",
+         format = "%(filename)10s:%(lineno)4d:%(message)s"
+    )
+
 import ply.yacc as yacc
 # Get the token map from the lexer.  This is required.
-from tpplex import tokens
-import tppsema
+import tpplex
+from tpplex import tokens, define_column
+import tppcache
+import mytree
 from mytree import MyNode
-from anytree.exporter import DotExporter, UniqueDotExporter
-from myerror import MyError
+from myerror import MyError, report
 
 error_handler = MyError('ParserErrors', showErrorMessage=True)
 root = None
+build_lock = threading.Lock()
+
+class RecoveryLoop(Exception):
+    # A recuperação de erro não consumiu a entrada (ver p_corpo_error).
+    pass
 
 # Sub-árvore.
 #       (programa)
@@ -31,11 +43,8 @@ root = None
 def p_programa(p):
     """programa : lista_declaracoes"""
 
-    global root
-
     programa = MyNode(name='programa', type='PROGRAMA', line=p.lexer.lineno)
 
-    root = programa
     p[0] = programa
     p[1].parent = programa
 
@@ -61,7 +70,7 @@ def p_lista_declaracoes_error(p):
     """
     error_type = 'ERR-SYN-LISTA-DECLARACOES'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -110,7 +119,7 @@ def p_declaracao_variavais_error(p):
     """
     error_type = 'ERR-SYN-LISTA-DECLARACAO-VARIAVEIS'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -148,7 +157,7 @@ def p_lista_variaveis_error(p):
     """
     error_type = 'ERR-SYN-LISTA-VARIAVEIS'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -170,7 +179,7 @@ def p_var_error(p):
     """
     error_type = 'ERR-SYN-VAR'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai    
 
@@ -216,7 +225,7 @@ def p_indice_error(p):
     """
     error_type = 'ERR-SYN-INDICE'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -258,7 +267,7 @@ def p_declaracao_funcao_error(p):
     """
     error_type = 'ERR-SYN-DECLARACAO-FUNCAO'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -300,7 +309,7 @@ def p_cabecalho_error(p):
     """
     error_type = 'ERR-SYN-CABECALHO'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -328,7 +337,7 @@ def p_lista_parametros_error(p):
     """
     error_type = 'ERR-SYN-LISTA-PARAMETROS'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -368,7 +377,7 @@ def p_parametro_error(p):
     """
     error_type = 'ERR-SYN-PARAMETRO'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -390,7 +399,15 @@ def p_corpo_error(p):
     """
     error_type = 'ERR-SYN-CORPO'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
+    # A recuperação precisa consumir a entrada: reduzir a regra de novo com
+    # o mesmo token à frente (o valor do símbolo error) levaria o parser à
+    # mesma configuração, para sempre.
+    lookahead = p.slice[1 if p.slice[1].type == 'error' else 2].value
+    if lookahead is p.parser.recovery:
+        report(error_handler.newError('ERR-SYN-RECOVERY-LOOP').format(getattr(lookahead, 'lineno', p.lexer.lineno)))
+        raise RecoveryLoop()
+    p.parser.recovery = lookahead
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -467,7 +484,7 @@ def p_se_error(p):
     """
     error_type = 'ERR-SYN-SE'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -498,7 +515,7 @@ def p_repita_error(p):
     """
     error_type = 'ERR-SYN-REPITA'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -523,7 +540,7 @@ def p_atribuicao_error(p):
     """
     error_type = 'ERR-SYN-ATRIBUICAO'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -554,7 +571,7 @@ def p_leia_error(p):
     """
     error_type = 'ERR-SYN-LEIA'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -585,7 +602,7 @@ def p_escreva_error(p):
     """
     error_type = 'ERR-SYN-ESCREVA'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -616,7 +633,7 @@ def p_retorna_error(p):
     """
     error_type = 'ERR-SYN-RETORNA'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -647,7 +664,7 @@ def p_expressao_logica_error(p):
         """
     error_type = 'ERR-SYN-EXPRESSAO-LOGICA'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -671,7 +688,7 @@ def p_expressao_simples_error(p):
         """
     error_type = 'ERR-SYN-EXPRESSAO-SIMPLES'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -695,7 +712,7 @@ def p_expressao_aditiva_error(p):
         """
     error_type = 'ERR-SYN-EXPRESSAO-ADITIVA'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -720,7 +737,7 @@ def p_expressao_multiplicativa_error(p):
         """
     error_type = 'ERR-SYN-EXPRESSAO-MULTIPLICATIVA'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -751,7 +768,7 @@ def p_expressao_unaria_error(p):
     """
     error_type = 'ERR-SYN-EXPRESSAO-UNARIA'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -788,7 +805,7 @@ def p_operador_relacional(p):
     else:
         error_type = 'ERR-SYN-FATOR'
         error_name = error_handler.newError(error_type)
-        print(error_name)
+        report(error_name)
 
     p[1] = filho
 
@@ -875,7 +892,7 @@ def p_fator_error(p):
         """
     error_type = 'ERR-SYN-FATOR'
     error_name = error_handler.newError(error_type, line=p.lexer.lineno)
-    print(error_name, line=p.lexer.lineno)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -933,7 +950,7 @@ def p_chamada_funcao_error(p):
         """
     error_type = 'ERR-SYN-CHAMADA-FUNCAO'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type, line=p.lexer.lineno)
     p[0] = pai
 
@@ -963,7 +980,7 @@ def p_lista_argumentos_error(p):
         """
     error_type = 'ERR-SYN-LISTA-ARGUMENTOS'
     error_name = error_handler.newError(error_type)
-    print(error_name)
+    report(error_name)
     pai = MyNode(name=error_name, type=error_type)
     p[0] = pai
 
@@ -973,51 +990,166 @@ def p_vazio(p):
     pai = MyNode(name='vazio', type='VAZIO', line=p.lexer.lineno)
     p[0] = pai
 
-def define_column(input, lexpos):
-    line_start = input.rfind("\n", 0, lexpos) + 1
-    return (lexpos - line_start) + 1
-
 def p_error(p):
 
     if p:
         token = p
         line = token.lineno
-        column = define_column(token.lexer.lexdata, token.lexpos)
-        print("Erro:[{line},{column}]: Erro próximo ao token '{token}'".format(
+        column = define_column(token)
+        report("Erro:[{line},{column}]: Erro próximo ao token '{token}'".format(
             line=line, column=column, token=token.value))
 
-def main():
-    numParameters = len(argv) # Número de parâmetros
+def parse(source, direct=False, lexer='ply'):
+    # Reseta o estado da compilação anterior antes de analisar o código.
+    # Com direct=True a árvore retornada já é a podada (ver tppast); lexer
+    # escolhe a implementação do lexer (tpplex.LEXERS).
+    if lexer == 'ply':
+        lexer = tpplex.get_lexer()
+        lexer.lineno = 1
+    else:
+        lexer = tpplex.new_lexer(lexer)
+    return parse_tokens(source, lexer, direct)
 
-    if numParameters != 2:
-        error = "The number of parameters is invalid. "
-        if numParameters < 2: 
-            error += "Send a .tpp file as parameter."
-            raise IOError(error_handler.newError('ERR-LEX-INVALID-PARAMETER-NOTFOUND'))
-        raise IOError(error_handler.newError('ERR-LEX-INVALID-PARAMETER'))
+def parse_file(path, direct=False, lexer='ply'):
+    # Como parse(), mas o código é lido do arquivo em pedaços e os tokens
+    # chegam ao parser sob demanda (tpplex.TokenStream).
+    return parse_tokens(None, tpplex.TokenStream(path, lexer), direct)
 
-    aux = argv[1].split('.')
+def parse_tokens(source, lexer, direct):
+    global root
+    root = None
+    mytree.reset_sequence()
+    if direct:
+        import tppast
+        parser = tppast.get_parser()
+    else:
+        parser = get_parser()
+    root = run(parser, source, lexer)
+    return root
+
+def run(parser, source, lexer, tokenfunc=None):
+    # Executa o parser e libera as pilhas; None se a recuperação de erro
+    # entrou em laço. tokenfunc, se dado, é usado no lugar de lexer.token.
+    parser.recovery = None
+    try:
+        return parser.parse(source, lexer=lexer, tokenfunc=tokenfunc)
+    except RecoveryLoop:
+        return None
+    finally:
+        parser.recovery = None
+        release(parser)
+
+def release(parser):
+    # O PLY guarda as pilhas da última análise, que referenciam a raiz;
+    # descarta as pilhas para a árvore poder ser liberada.
+    parser.symstack = None
+    parser.statestack = None
+
+def main(path=None, emit_ast='none', direct=False, lexer='ply'):
+    if path is None:
+        numParameters = len(argv) # Número de parâmetros
+
+        if numParameters != 2:
+            error = "The number of parameters is invalid. "
+            if numParameters < 2: 
+                error += "Send a .tpp file as parameter."
+                raise IOError(error_handler.newError('ERR-LEX-INVALID-PARAMETER-NOTFOUND'))
+            raise IOError(error_handler.newError('ERR-LEX-INVALID-PARAMETER'))
+        path = argv[1]
+
+    aux = path.split('.')
     if aux[-1] != 'tpp':
       raise IOError(error_handler.newError('ERR-SYN-NOT-TPP'))
-    elif not os.path.exists(argv[1]):
+    elif not os.path.exists(path):
         raise IOError(error_handler.newError('ERR-SYN-FILE-NOT-EXISTS'))
     else:
-        data = open(argv[1])
-        source_file = data.read()
-        parser.parse(source_file)
+        parse_file(path, direct, lexer)
 
     if root and root.children != ():
-        UniqueDotExporter(root).to_picture(argv[1] + ".unique.ast.png")
-        DotExporter(root).to_dotfile(argv[1] + ".ast.dot")
-        UniqueDotExporter(root).to_dotfile(argv[1] + ".unique.ast.dot")
+        # Com direct=True não há árvore concreta para exportar.
+        if not direct:
+            # path.unique.ast.png, path.ast.dot e path.unique.ast.dot
+            mytree.exports.append(mytree.exportTree(root, path + ".unique.ast", emit_ast))
+            mytree.exports.append(mytree.exportTree(root, path + ".ast", emit_ast, unique=False, picture=False))
 
     else:
-        print(error_handler.newError('WAR-SYN-NOT-GEN-SYN-TREE'))
+        report(error_handler.newError('WAR-SYN-NOT-GEN-SYN-TREE'))
     return root
 
+def grammar_signature():
+    # Hash da gramática: lista de tokens + docstrings de todas as regras p_*.
+    # Qualquer alteração na gramática gera uma nova assinatura e, portanto,
+    # um novo arquivo de tabelas na cache.
+    signature = hashlib.sha256()
+    signature.update(yacc.__version__.encode())
+    signature.update(str(yacc.__tabversion__).encode())
+    signature.update(' '.join(tokens).encode())
+    for name in sorted(globals()):
+        rule = globals()[name]
+        if name.startswith('p_') and callable(rule) and rule.__doc__:
+            signature.update(name.encode())
+            signature.update(rule.__doc__.encode())
+    return signature.hexdigest()
+
+def build_parser():
+    try:
+        tabfile = os.path.join(tppcache.cache_dir('parser'),
+                               'tpp_parser_tab-%s.pickle' % grammar_signature())
+    except OSError:
+        # Sem diretório de cache disponível: gera as tabelas em memória.
+        tabfile = None
+
+    if tabfile and os.path.exists(tabfile):
+        table = yacc.LRTable()
+        try:
+            table.read_pickle(tabfile)
+            table.bind_callables(globals())
+            return yacc.LRParser(table, p_error)
+        except Exception:
+            # Arquivo corrompido ou de outra versão do PLY: gera novamente.
+            pass
+
+    if not tabfile:
+        return yacc.yacc(method="LALR", optimize=True, start='programa', debug=False,
+                         debuglog=log, write_tables=False, tabmodule='tpp_parser_tab')
+
+    # As tabelas são geradas em um arquivo temporário e publicadas com
+    # os.replace(), seguro com vários compiladores executando ao mesmo tempo.
+    tmp = tppcache.temp_path(tabfile)
+    try:
+        parser = yacc.yacc(method="LALR", optimize=True, start='programa', debug=False,
+                           debuglog=log, write_tables=False, tabmodule='tpp_parser_tab',
+                           picklefile=tmp)
+        if os.path.exists(tmp):
+            os.replace(tmp, tabfile)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return parser
+
 # Build the parser.
-parser = yacc.yacc(method="LALR", optimize=True, start='programa', debug=False,
-                   debuglog=log, write_tables=False, tabmodule='tpp_parser_tab')
+# As tabelas são carregadas no primeiro uso, e não na importação do módulo.
+def get_parser():
+    global parser
+    with build_lock:
+        try:
+            return parser
+        except NameError:
+            parser = build_parser()
+            return parser
+
+def new_parser():
+    # Parser independente (pilhas próprias) que compartilha as tabelas LALR,
+    # para compilações simultâneas em threads diferentes.
+    return copy.copy(get_parser())
+
+def __getattr__(name):
+    # Mantém o acesso a tppparser.parser funcionando para quem importa o módulo.
+    if name == 'parser':
+        return get_parser()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(emit_ast='png')
+    for failure in mytree.waitExports(mytree.exports):
+        report(error_handler.newError('WAR-SYN-NOT-EXPORT-TREE').format(failure))
\ No newline at end of file
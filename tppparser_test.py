@@ -0,0 +1,102 @@
+import os
+import tpplex
+import tppparser
+from myerror import diagnostics
+
+def test_001():
+    # A assinatura da gramática é estável entre chamadas.
+    assert tppparser.grammar_signature() == tppparser.grammar_signature()
+
+def test_002(tmp_path, monkeypatch):
+    # Primeira construção grava as tabelas na cache, a segunda reutiliza.
+    monkeypatch.setenv('TPP_CACHE_DIR', str(tmp_path))
+    tppparser.build_parser()
+    files = os.listdir(tmp_path / 'v1' / 'parser')
+    assert files == ['tpp_parser_tab-%s.pickle' % tppparser.grammar_signature()]
+
+    parser = tppparser.build_parser()
+    assert parser.parse('inteiro principal()\nfim\n', lexer=tpplex.get_lexer()) is not None
+
+def test_003(tmp_path, monkeypatch):
+    # Uma tabela corrompida na cache é descartada e gerada novamente.
+    monkeypatch.setenv('TPP_CACHE_DIR', str(tmp_path))
+    tppparser.build_parser()
+    tabfile = tmp_path / 'v1' / 'parser' / ('tpp_parser_tab-%s.pickle' % tppparser.grammar_signature())
+    tabfile.write_bytes(b'lixo')
+
+    parser = tppparser.build_parser()
+    assert parser.parse('inteiro principal()\nfim\n', lexer=tpplex.get_lexer()) is not None
+
+def test_004(monkeypatch):
+    # Alterar uma regra da gramática invalida a cache.
+    signature = tppparser.grammar_signature()
+    monkeypatch.setattr(tppparser.p_vazio, '__doc__', 'vazio : VIRGULA')
+    assert tppparser.grammar_signature() != signature
+
+def test_005():
+    # Cada chamada a parse() começa uma nova compilação (linhas e sequência de nós).
+    source = 'inteiro: a\n\ninteiro principal()\n  a := 1\nfim\n'
+    first = tppparser.parse(source)
+    second = tppparser.parse(source)
+    assert first is not second
+    assert tppparser.root is second
+    assert first.line == second.line
+    assert first.id == second.id
+
+def test_006():
+    # Erros de sintaxe na mesma linha: coluna de cada token, com os dois lexers.
+    source = 'inteiro principal()\n  ' + 'x := * 1 ' * 3 + '\nfim\n'
+    for lexer in tpplex.LEXERS:
+        errors = []
+        token = diagnostics.set(errors)
+        tppparser.parse(source, lexer=lexer)
+        diagnostics.reset(token)
+        assert errors[0::2] == ["Erro:[2,%d]: Erro próximo ao token '*'" % column for column in (8, 17, 26)]
+
+def test_007(tmp_path, monkeypatch):
+    # Lendo o arquivo em pedaços, a árvore e as mensagens são as mesmas.
+    monkeypatch.setattr(tpplex, 'CHUNK_SIZE', 32)
+    source = open('tests/gencode-014.tpp').read() + 'inteiro f()\n  x := * 1\n  y := / 2\nfim\n'
+    path = tmp_path / 'erros.tpp'
+    path.write_text(source)
+    results = []
+    for tree in (lambda: tppparser.parse(source), lambda: tppparser.parse_file(str(path))):
+        errors = []
+        token = diagnostics.set(errors)
+        root = tree()
+        diagnostics.reset(token)
+        nodes, stack = [], [root]
+        while stack:
+            node = stack.pop()
+            nodes.append((node.name, node.line))
+            stack.extend(node.children)
+        results.append((nodes, errors))
+    assert results[0] == results[1]
+    assert "Erro:[%d,8]: Erro próximo ao token '/'" % (source.count('\n') - 1) in results[1][1]
+
+def test_008():
+    # A recuperação de erro que não consome a entrada é interrompida: um
+    # 'fim' perdido na condição e o fator '(a 20)' não travam o parser.
+    sources = ['inteiro principal()\n  inteiro: x\n  se x fim > 1 então\n    x := 1\n  fim\n  retorna(x)\nfim\n',
+               'inteiro principal()\n  inteiro: x\n  se (a 20) então\n    x := 1\n  fim\n  retorna(x)\nfim\n']
+    for source in sources:
+        for direct in [False, True]:
+            errors = []
+            token = diagnostics.set(errors)
+            root = tppparser.parse(source, direct=direct)
+            diagnostics.reset(token)
+            assert root is None
+            assert len(errors) < 20
+            assert errors[-1].endswith('análise sintática interrompida.')
+
+def test_009(monkeypatch):
+    # As mensagens de uma compilação são limitadas: no limite, a compilação
+    # é interrompida.
+    import pytest
+    import myerror
+    from tppcompiler import Compilation
+    monkeypatch.setattr(myerror, 'MAX_DIAGNOSTICS', 10)
+    compilation = Compilation('inteiro principal()\n' + '  x := * 1\n' * 20 + 'fim\n')
+    with pytest.raises(myerror.TooManyMessages):
+        compilation.run()
+    assert len(compilation.errors) == 10
@@ -0,0 +1,145 @@
+import re
+import threading
+from sys import intern
+
+import tpplex
+from myerror import report
+
+# Scanner alternativo ao ply.lex: uma única expressão regular com um grupo
+# nomeado por regra e um laço sobre re.finditer, sem chamar uma função por
+# token. As regras são as do tpplex, na mesma ordem em que o PLY as tenta
+# (funções na ordem de definição e depois os símbolos, da expressão mais
+# longa para a mais curta). Os espaços ignorados são um prefixo da expressão
+# e o caractere inválido é um grupo extra, no fim.
+#
+# A interface é a que o parser usa do lexer do PLY: input(), token() e
+# lineno, com tokens que têm type, value, lineno, lexpos e lexer. A entrada
+# também pode ser bytes em UTF-8, como um arquivo mapeado na memória
+# (tpplex.map_file): a expressão é a mesma, convertida para bytes, e só os
+# valores dos tokens são decodificados.
+
+build_lock = threading.Lock()
+patterns = {}
+
+class Token():
+    __slots__ = ('type', 'value', 'lineno', 'lexpos', 'lexer')
+
+    def __init__(self, type, value, lineno, lexpos, lexer):
+        self.type = type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+        self.lexer = lexer
+
+    def __repr__(self):
+        return 'LexToken(%s,%r,%d,%d)' % (self.type, self.value, self.lineno, self.lexpos)
+
+
+def rules():
+    # (nome, expressão) das regras do tpplex, na ordem do PLY.
+    module = vars(tpplex)
+    functions = [rule for name, rule in module.items()
+                 if name.startswith('t_') and callable(rule) and name != 't_error']
+    functions.sort(key=lambda rule: rule.__code__.co_firstlineno)
+    strings = [(name[2:], rule) for name, rule in module.items()
+               if name.startswith('t_') and isinstance(rule, str) and name != 't_ignore']
+    strings.sort(key=lambda rule: len(rule[1]), reverse=True)
+    return [(rule.__name__[2:], getattr(rule, 'regex', rule.__doc__)) for rule in functions] + strings
+
+
+def utf8(rule):
+    # Expressão de uma regra para bytes em UTF-8. Só as classes com letras
+    # acentuadas mudam: cada letra ocupa dois bytes, então a classe vira uma
+    # alternativa com os caracteres ASCII e, para cada byte inicial, a classe
+    # dos bytes finais.
+    def convert(match):
+        chars = match.group(1)
+        wide = [char.encode() for char in chars if ord(char) > 127]
+        if not wide:
+            return match.group(0)
+        assert not chars.startswith('^')
+        groups = {}
+        for char in wide:
+            groups.setdefault(char[:-1], []).append(char[-1])
+        alternatives = ['[%s]' % ''.join(char for char in chars if ord(char) <= 127)]
+        for lead, last in groups.items():
+            alternatives.append('%s[%s]' % (escape(lead), escape(last)))
+        return '(?:%s)' % '|'.join(alternatives)
+    return re.sub(r'\[([^\]]*)\]', convert, rule).encode('ascii')
+
+
+def escape(data):
+    return ''.join('\\x%02x' % byte for byte in data)
+
+
+def build_pattern(binary=False):
+    # Com binary=True a expressão é sobre bytes em UTF-8 (arquivo mapeado
+    # na memória) e um caractere inválido pode ter mais de um byte.
+    ignore = re.escape(tpplex.t_ignore)
+    if binary:
+        groups = ['(?P<%s>%s)' % (name, utf8(rule).decode()) for name, rule in rules()]
+        groups.append('(?P<error>[^%s\\x80-\\xff]|[\\x80-\\xff][\\x80-\\xbf]*)' % ignore)
+        pattern = re.compile(('[%s]*(?:%s)' % (ignore, '|'.join(groups))).encode('ascii'), re.VERBOSE)
+    else:
+        groups = ['(?P<%s>%s)' % rule for rule in rules()]
+        groups.append('(?P<error>[^%s])' % ignore)
+        pattern = re.compile('[%s]*(?:%s)' % (ignore, '|'.join(groups)), re.VERBOSE)
+    # m.lastgroup só identifica a regra se elas não tiverem grupos próprios.
+    assert pattern.groups == len(groups)
+    return pattern
+
+
+def get_pattern(binary=False):
+    with build_lock:
+        if binary not in patterns:
+            patterns[binary] = build_pattern(binary)
+        return patterns[binary]
+
+
+class Scanner():
+
+    def __init__(self):
+        self.lexdata = ''
+        self.lexpos = 0
+        self.lineno = 1
+        self.tokens = iter(())
+
+    def input(self, data):
+        # data é um str ou um objeto de bytes (bytes, mmap), em UTF-8.
+        self.lexdata = data
+        self.lexpos = 0
+        self.tokens = self.scan(data, not isinstance(data, str))
+
+    def token(self):
+        return next(self.tokens, None)
+
+    def __iter__(self):
+        return self.tokens
+
+    def scan(self, data, binary):
+        # lexpos do scanner só é atualizado no fim da entrada; a posição de
+        # cada token fica no próprio token (em bytes, se a entrada é binária).
+        # Os valores são internados como no tpplex (também os dos símbolos,
+        # sem custo extra aqui).
+        reserved = tpplex.reserved_words.get
+        for match in get_pattern(binary).finditer(data):
+            kind = match.lastgroup
+            value = match.group(kind)
+            if binary:
+                value = value.decode('utf-8', 'replace')
+            if kind == 'ID':
+                value = intern(value)
+                yield Token(reserved(value, 'ID'), value, self.lineno, match.start(kind), self)
+            elif kind == 'newline':
+                self.lineno += len(value)
+            elif kind == 'COMENTARIO':
+                self.lineno += value.count('\n')
+            elif kind == 'error':
+                report(tpplex.le.newError('ERR-LEX-INV-CHAR', valor=value))
+            else:
+                yield Token(kind, intern(value), self.lineno, match.start(kind), self)
+        self.lexpos = len(data)
+
+
+def new_scanner():
+    return Scanner()
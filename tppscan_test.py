@@ -0,0 +1,73 @@
+import glob
+import random
+import tpplex
+import tppparser
+from myerror import diagnostics
+from tppcompiler import Compilation
+
+def tokens(kind, source):
+    errors = []
+    token = diagnostics.set(errors)
+    try:
+        lexer = tpplex.new_lexer(kind)
+        lexer.input(source)
+        result = [(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in iter(lexer.token, None)]
+    finally:
+        diagnostics.reset(token)
+    return result, errors, lexer.lineno
+
+def test_001():
+    # Os dois lexers geram os mesmos tokens em todos os programas de teste.
+    for path in sorted(glob.glob('tests/*.tpp')):
+        source = open(path).read()
+        assert tokens('regex', source) == tokens('ply', source), path
+
+def test_002():
+    # ... e nas mesmas entradas inválidas (caracteres inválidos, comentários
+    # sem fechamento, números incompletos, espaços no fim).
+    generator = random.Random(2021)
+    alphabet = 'ab_eE019.+-{}\n :=<>!&|()[],*/áé$# \t\r'
+    for i in range(2000):
+        source = ''.join(generator.choice(alphabet) for j in range(generator.randint(0, 60)))
+        assert tokens('regex', source) == tokens('ply', source), repr(source)
+
+def test_003():
+    # Compilação com o scanner: mesmo módulo e mesmas mensagens.
+    for path in ['tests/gencode-001.tpp', 'tests/gencode-014.tpp']:
+        assert Compilation.from_file(path, lexer='regex').run() == Compilation.from_file(path).run()
+    ply = Compilation.from_file('tests/gencode-012.tpp')
+    regex = Compilation.from_file('tests/gencode-012.tpp', lexer='regex')
+    ply.parse()
+    regex.parse()
+    assert regex.errors == ply.errors != []
+
+def test_004(tmp_path):
+    # Sobre bytes em UTF-8 (arquivo mapeado): mesmos tokens, posições em bytes.
+    generator = random.Random(2022)
+    alphabet = 'ab_eE019.+-{}\n :=<>!&|()[],*/áéçÕ$# \t\r'
+    for i in range(1000):
+        source = ''.join(generator.choice(alphabet) for j in range(generator.randint(0, 60)))
+        result, errors, lineno = tokens('mmap', source.encode())
+        expected, expected_errors, expected_lineno = tokens('regex', source)
+        assert [(type, value, line, len(source.encode()[:lexpos].decode())) for type, value, line, lexpos in result] \
+            == expected, repr(source)
+        assert (errors, lineno) == (expected_errors, expected_lineno)
+    path = tmp_path / 'vazio.tpp'
+    path.write_text('')
+    assert tpplex.map_file(str(path)) == b''
+
+def test_005():
+    # Compilação e mensagens de erro (colunas em caracteres) com o arquivo mapeado.
+    for path in ['tests/gencode-001.tpp', 'tests/gencode-014.tpp']:
+        assert Compilation.from_file(path, lexer='mmap').run() == Compilation.from_file(path).run()
+    ply = Compilation.from_file('tests/gencode-012.tpp')
+    mapped = Compilation.from_file('tests/gencode-012.tpp', lexer='mmap')
+    ply.parse()
+    mapped.parse()
+    assert mapped.errors == ply.errors
+    source = 'inteiro índice()\n  ótimo := * 1\nfim\n'
+    errors = []
+    token = diagnostics.set(errors)
+    tppparser.parse(source.encode(), lexer='mmap')
+    diagnostics.reset(token)
+    assert errors[0] == "Erro:[2,12]: Erro próximo ao token '*'"
@@ -1,173 +1,286 @@
 import os
 import sys
 import logging
+import contextvars
 from sys import argv
-from myerror import MyError
-from anytree import RenderTree, findall_by_attr, LevelOrderIter
-from anytree.exporter import DotExporter, UniqueDotExporter
-
-logging.basicConfig(
-     level = logging.DEBUG,
-     filename = "sema.log",
-     filemode = "w",
-     format = "%(filename)10s:%(lineno)4d:%(message)s"
-)
+import mytree
+from myerror import MyError, report
+
 log = logging.getLogger()
 error_handler = MyError('SemaErrors', showErrorMessage=True)
 root = None
 
-variablesError = []
+# Variáveis com erro já reportado, como pares (nome, escopo). Cada
+# compilação (e cada thread) tem o seu próprio conjunto, iniciado por reset().
+variablesError = contextvars.ContextVar('variablesError', default=None)
+
+def reset(tree=None):
+    # Reseta o estado da análise anterior (usado na compilação em lote).
+    global root
+    root = tree
+    variablesError.set(set())
+
+def getVariablesError():
+    errors = variablesError.get()
+    if errors is None:
+        errors = set()
+        variablesError.set(errors)
+    return errors
 
 def addVaribleError(name, scope):
-    variablesError.append({
-        'name': name,
-        'scope': scope
-    })
+    getVariablesError().add((name, scope))
 
 def variableHasError(name, scope):
-    for variable in variablesError:
-        if variable['name'] == name and variable['scope'] == scope:
-            return True
-    return False
+    return (name, scope) in getVariablesError()
+
+## Tabela de símbolos
+
+class Symbol():
+    # Registro de uma variável, parâmetro ou função da tabela de símbolos.
+    __slots__ = ('declarationType', 'type', 'line', 'token', 'name', 'scope', 'init', 'used',
+                 'dimension', 'sizeDimension1', 'sizeDimension2', 'errors', 'parameters')
+
+    def __init__(self, declarationType, type, line, token, name, scope, init='N', used='N',
+                 dimension=0, sizeDimension1=1, sizeDimension2=0, parameters=()):
+        self.declarationType = declarationType
+        self.type = type
+        self.line = line
+        self.token = token
+        self.name = name
+        self.scope = scope
+        self.init = init
+        self.used = used
+        self.dimension = dimension
+        self.sizeDimension1 = sizeDimension1
+        self.sizeDimension2 = sizeDimension2
+        self.errors = 0
+        self.parameters = parameters
+
+class SymbolTable():
+    # Escopos indexados por nome: 'global' e um escopo para cada função, além
+    # dos parâmetros de cada função. A busca segue a cadeia
+    # local -> parâmetros da função -> global.
+
+    def __init__(self):
+        self.symbols = []
+        self.scopes = {'global': {}}
+        self.parameters = {}
+
+    def __iter__(self):
+        # Ordem de declaração, usada nos avisos de variáveis e funções.
+        return iter(self.symbols)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def insert(self, symbol):
+        self.symbols.append(symbol)
+        self.scopes.setdefault(symbol.scope, {})[symbol.name] = symbol
+        if symbol.declarationType == 'func':
+            parameters = self.parameters.setdefault(symbol.name, {})
+            for parameter in symbol.parameters:
+                parameters.setdefault(parameter.name, parameter)
+
+    def lookup(self, name, scope='global'):
+        if scope != 'global':
+            symbol = self.scopes.get(scope, {}).get(name)
+            if symbol == None:
+                symbol = self.parameters.get(scope, {}).get(name)
+            if symbol != None:
+                return symbol
+        return self.scopes['global'].get(name)
+
+    def function(self, name):
+        symbol = self.scopes['global'].get(name)
+        if symbol != None and symbol.declarationType == 'func':
+            return symbol
+        return None
+
+## Travessia da árvore
+
+class Visitor():
+    # Percorre a árvore em pré-ordem, sem recursão (as listas da gramática são
+    # recursivas à esquerda e deixam a árvore tão profunda quanto o programa),
+    # chamando visit(nó) e visit_<nome> ao entrar em um nó e leave_<nome> ao
+    # sair dele. Quando visit_<nome> retorna False os filhos do nó não são
+    # visitados.
+
+    def walk(self, tree):
+        stack = [(tree, None)]
+        while stack:
+            node, leave = stack.pop()
+            if leave != None:
+                leave(node)
+                continue
+            # Folhas (nomes, números e símbolos) não são visitadas: um
+            # identificador pode ter o mesmo nome de uma regra da gramática.
+            if not node.children:
+                continue
+            self.visit(node)
+            visit = getattr(self, 'visit_' + node.name, None)
+            if visit != None and visit(node) == False:
+                continue
+            leave = getattr(self, 'leave_' + node.name, None)
+            if leave != None:
+                stack.append((node, leave))
+            stack.extend((child, None) for child in reversed(node.children))
+
+    def visit(self, node):
+        pass
+
+class AnnotationVisitor(Visitor):
+    # Anota em cada nó o escopo (scope) e se ele está dentro de um índice
+    # (inIndex) ou de uma lista de argumentos (inArgument), consultados por
+    # getScope, valueIsIndex e valueIsArgument.
+
+    def __init__(self):
+        self.scope = 'global'
+        self.indexes = 0
+        self.arguments = 0
+
+    def visit(self, node):
+        node.scope = self.scope
+        node.inIndex = self.indexes > 0
+        node.inArgument = self.arguments > 0
+
+    def visit_cabecalho(self, node):
+        if node.children[0].name == 'ID':
+            self.scope = node.children[0].children[0].name
+
+    def leave_cabecalho(self, node):
+        self.scope = 'global'
+
+    def visit_indice(self, node):
+        self.indexes += 1
+
+    def leave_indice(self, node):
+        self.indexes -= 1
+
+    def visit_lista_argumentos(self, node):
+        self.arguments += 1
+
+    def leave_lista_argumentos(self, node):
+        self.arguments -= 1
+
+def annotate(tree):
+    AnnotationVisitor().walk(tree)
+
+class DeclarationVisitor(AnnotationVisitor):
+    # Primeira travessia: anota a árvore e monta a tabela de símbolos com as
+    # variáveis globais, as funções, os parâmetros e as variáveis locais.
+
+    def __init__(self):
+        super(DeclarationVisitor, self).__init__()
+        self.table = SymbolTable()
+        self.local = False
+
+    def declare(self, variable, error):
+        if variableIsDeclared(table=self.table, name=variable.name, scope=self.scope):
+            typeVar = getType(table=self.table, name=variable.name, scope=self.scope)
+            report(error_handler.newError(error).format(variable.name, typeVar))
+            return False
+        self.table.insert(variable)
+        return True
+
+    def visit_declaracao_variaveis(self, node):
+        if self.scope == 'global' or self.local:
+            for variable in variableDeclaration(node1=node, scope=self.scope):
+                self.declare(variable, 'WAR-SEM-VAR-DECL-PREV')
+
+    def visit_declaracao_funcao(self, node):
+        header = node.children[-1]
+        if header.name != 'cabecalho':
+            return False
+        if node.children[0].name == 'tipo':
+            leaf = node.children[0].children[0].children[0]
+            type = leaf.name
+        else:
+            leaf = header.children[0].children[0]
+            type = 'vazio'
+        token = header.children[0].name
+        name = header.children[0].children[0].name
 
-def symbolTable():
-    res = findall_by_attr(root, "declaracao")
-    variables = []
-    for p in res:
-        item = [node for pre, fill, node in RenderTree(p)]
-        if (item[1].name == "declaracao_variaveis"):
-            variable = variableDeclaration(node1=item[1], scope="global")
-            if variableIsDeclared(table=variables, name=variable['name'], scope='global'):
-                typeVar = getType(table=variables, name=variable['name'], scope='global')
-                print(error_handler.newError('WAR-SEM-VAR-DECL-PREV').format(variable['name'], typeVar))
-            else:
-                variables.append(variable)
-        elif (item[1].name == "declaracao_funcao"):
-            if item[2].name == "tipo":
-                name = item[7].name
-                token = item[6].name
-                type = item[4].name
-                line = item[4].line
-            else:
-                name = item[4].name
-                token = item[3].name
-                type = 'vazio'
-                line = item[4].line
-
-            variable = {
-                "declarationType": 'func',
-                "type": type,
-                "line": line,
-                "token": token,
-                "name": name,
-                "scope": "global",
-                "used": "S" if name == "principal" else "N",
-                "dimension": 0,
-                "sizeDimension1": 1,
-                "sizeDimension2": 0,
-                "parameters": parametersDeclaration(item)
-            }
-            if variableIsDeclared(table=variables, name=name, scope='global'):
-                typeVar = getType(table=variables, name=name, scope='global')
-                print(error_handler.newError('WAR-SEM-FUNC-DECL-PREV').format(name, typeVar))
-            else:
-                variables.append(variable)
-                functionDeclaration(node1=item[1], scope=name, table=variables)
-    return variables
+        function = Symbol(declarationType='func', type=type, line=leaf.line, token=token, name=name,
+                          scope='global', used='S' if name == 'principal' else 'N',
+                          parameters=parametersDeclaration(header, scope=name))
+        # As variáveis locais só são declaradas se a função foi declarada.
+        self.local = self.declare(function, 'WAR-SEM-FUNC-DECL-PREV')
+
+    def leave_declaracao_funcao(self, node):
+        self.local = False
+
+def symbolTable(tree):
+    visitor = DeclarationVisitor()
+    visitor.walk(tree)
+    return visitor.table
+
+def parametersDeclaration(header, scope):
+    from anytree import findall_by_attr
 
-def parametersDeclaration(node1):
     parameters = []
-    for item in node1:
-        if item.name == 'cabecalho':
-            aux = item.children[2]
-            parametersFound = findall_by_attr(aux, "parametro")
-            for p2 in parametersFound:
-                parameter = {} 
-                parameter['type'] = p2.children[0].children[0].children[0].name
-                parameter['name'] = p2.children[2].children[0].name
-                parameters.append(parameter)
+    parametersFound = findall_by_attr(header.children[2], "parametro")
+    for p2 in parametersFound:
+        type = p2.children[0].children[0].children[0].name
+        id = p2.children[2].children[0]
+        parameters.append(Symbol(declarationType='param', type=type, line=id.line,
+                                 token='ID', name=id.name, scope=scope))
     return parameters
 
-def functionDeclaration(node1, scope, table):
-    res = findall_by_attr(node1, "declaracao_variaveis")
-    for p in res:
-        variable = variableDeclaration(node1=p, scope=scope)
-        if variableIsDeclared(table=table, name=variable['name'], scope=scope):
-            typeVar = getType(table=table, name=variable['name'], scope=scope)
-            print(error_handler.newError('WAR-SEM-VAR-DECL-PREV').format(variable['name'], typeVar))
-        else:
-            table.append(variable)
-
 def variableDeclaration(node1, scope):
-    d1 = 1
-    d2 = 0
-    dimension = 0 
-    renderNodeTree = [node for pre, fill, node in RenderTree(node1)]
-    for i in range(len(renderNodeTree)):
-        if (renderNodeTree[i].name == 'tipo'):
-            type = renderNodeTree[i+2].name
-            line = renderNodeTree[i+2].line
-        elif (renderNodeTree[i].name == 'ID'): 
-            token = renderNodeTree[i].name
-            name = renderNodeTree[i+1].name
-        elif (renderNodeTree[i].name == 'fecha_colchete'):
-            dimension+=1
-            if renderNodeTree[i-2].name == 'NUM_PONTO_FLUTUANTE':
-                if not variableHasError(name, scope):
-                    addVaribleError(name,scope)
-                    print(error_handler.newError('ERR-SEM-ARRAY-INDEX-NOT-INT').format(name))
-            index = renderNodeTree[i-1].name
-            if (dimension == 2):
-                d2 = index
-            else:
-                d1 = index
-
-    variable = {
-        'declarationType': 'var',
-        'type': type,
-        'line': line,
-        'token': token,
-        'name': name,
-        'scope': scope,
-        'init': 'N',
-        'used': 'N',
-        'dimension': dimension,
-        'sizeDimension1': d1,
-        'sizeDimension2': d2,
-        'errors': 0
-    }
-
-    return variable
+    # Um símbolo para cada variável da lista (inteiro: a, b[10], ...).
+    from anytree import RenderTree
+
+    type = node1.children[0].children[0].children[0]
+    item = node1.children[2]
+    variables = []
+    while item.name == 'lista_variaveis':
+        variables.insert(0, item.children[-1])
+        item = item.children[0]
+
+    symbols = []
+    for var in variables:
+        token = var.children[0].name
+        name = var.children[0].children[0].name
+        d1 = 1
+        d2 = 0
+        dimension = 0
+        renderNodeTree = [node for pre, fill, node in RenderTree(var)]
+        for i in range(len(renderNodeTree)):
+            if (renderNodeTree[i].name == 'fecha_colchete'):
+                dimension+=1
+                if renderNodeTree[i-2].name == 'NUM_PONTO_FLUTUANTE':
+                    if not variableHasError(name, scope):
+                        addVaribleError(name,scope)
+                        report(error_handler.newError('ERR-SEM-ARRAY-INDEX-NOT-INT').format(name))
+                index = renderNodeTree[i-1].name
+                if (dimension == 2):
+                    d2 = index
+                else:
+                    d1 = index
+
+        symbols.append(Symbol(declarationType='var', type=type.name, line=type.line, token=token, name=name,
+                              scope=scope, dimension=dimension, sizeDimension1=d1, sizeDimension2=d2))
+    return symbols
 
 def mainFunctionExists(table):
-    for i in range(len(table)):
-        if table[i]['declarationType'] == 'func' and table[i]['name'] == 'principal':
-            return True
-    return False
+    return table.function('principal') != None
 
 def variableIsDeclared(table, name, scope):
-    for i in range(len(table)):
-        if table[i]['name'] == name and (table[i]['scope'] == 'global' or table[i]['scope'] == scope):
-            return True
-        elif scope != 'global' and table[i]['declarationType'] == 'func':
-            parameters = table[i]['parameters']
-            for j in parameters:
-                if j['name'] == name:
-                    return True
-    return False
+    return table.lookup(name, scope) != None
 
 def getType(table, name, scope):
-    for i in range(len(table)):
-        if table[i]['name'] == name and (table[i]['scope'] == 'global' or table[i]['scope'] == scope):
-            return table[i]['type']
-        elif scope != 'global' and table[i]['declarationType'] == 'func':
-            parameters = table[i]['parameters']
-            for j in parameters:
-                if j['name'] == name:
-                    return table[i]['type']
+    symbol = table.lookup(name, scope)
+    if symbol != None:
+        return symbol.type
     return None
 
 def getScope(node):
+    # Nós anotados por annotate() (ou pela análise semântica) respondem
+    # direto; os demais procuram o cabecalho entre os ancestrais.
+    try:
+        return node.scope
+    except AttributeError:
+        pass
     anchestors = list(node.anchestors)
     for i in range(len(anchestors)):
         if anchestors[i].name == 'cabecalho' and anchestors[i].children[0].name == 'ID':
@@ -176,6 +289,10 @@ def getScope(node):
     return 'global'
 
 def valueIsIndex(node):
+    try:
+        return node.inIndex
+    except AttributeError:
+        pass
     anchestors = list(node.anchestors)
     for i in range(len(anchestors)):
         if anchestors[i].name == 'indice':
@@ -183,6 +300,10 @@ def valueIsIndex(node):
     return False
 
 def valueIsArgument(node):
+    try:
+        return node.inArgument
+    except AttributeError:
+        pass
     anchestors = list(node.anchestors)
     for i in range(len(anchestors)):
         if anchestors[i].name == 'lista_argumentos':
@@ -190,10 +311,17 @@ def valueIsArgument(node):
     return False
 
 def getFactors(node1, table, scope):
-    res = findall_by_attr(node1, "fator")
+    # Fatores da expressão fora de índices e de argumentos de chamadas. Os
+    # fatores entre parênteses são substituídos pelos fatores de dentro deles.
     factors = []
-    for p in res:
-        if not valueIsIndex(p) and not valueIsArgument(p):
+    if valueIsIndex(node1) or valueIsArgument(node1):
+        return factors
+    stack = [node1]
+    while stack:
+        p = stack.pop()
+        if p.name in ('indice', 'lista_argumentos'):
+            continue
+        if p.name == 'fator' and p.children and p.children[0].name != 'ABRE_PARENTESE':
             factor = p.children[0].name
             factor = factor if factor != 'chamada_funcao' else 'func'
             
@@ -208,6 +336,8 @@ def getFactors(node1, table, scope):
                     'type': type,
                     'value': value
                 })
+            continue
+        stack.extend(reversed(p.children))
     return factors
 
 def getTypeFactors(factors, type):
@@ -226,183 +356,213 @@ def getCountParameters(node):
         item = item.children[0]
     return i
 
-def checkCoercions(table, name, scope, node):
-    factors = getFactors(node, table, scope)
-    type = None
-    for i in range(len(table)):
-        type = None
-
-        try:
-            parameters = table[i]['parameters']
-        except:
-            parameters = None
-
-        if table[i]['name'] == name and (table[i]['scope'] == 'global' or table[i]['scope'] == scope):
-            type = table[i]['type']
-        elif parameters != None and len(parameters) > 0:
-            for parameter in parameters:
-                if parameter['name'] == name:
-                    type = parameter['type']
-        
-        if type != None:
-            if len(factors) == 1:
-                type_factor = factors[0]['type']
-                if type_factor != type:
-                    value_factor = factors[0]['value']
-                    factor = factors[0]['factor']
-                    if factor == 'var':
-                        print(error_handler.newError('WAR-SEM-ATR-DIFF-TYPES-IMP-COERC-OF-VAR').format(value_factor, type_factor, name, type))
-                    elif factor == 'func':
-                        print(error_handler.newError('WAR-SEM-ATR-DIFF-TYPES-IMP-COERC-OF-RET-VAL').format(value_factor, type_factor, name, type))
-                    else:
-                        print(error_handler.newError('WAR-SEM-ATR-DIFF-TYPES-IMP-COERC-OF-NUM').format(value_factor, type_factor, name, type))                        
-            else:
-                type_factor = getTypeFactors(factors, type)
-                if type_factor != type:
-                    value_factor = 'expressao'
-                    print(error_handler.newError('WAR-SEM-ATR-DIFF-TYPES-IMP-COERC-OF-EXP').format(value_factor, type_factor, name, type))
-
-def initVariables(table, name, scope, node):
-    if variableIsDeclared(table=table, name=name, scope=scope):
-        checkCoercions(table=table, name=name, scope=scope, node=node)
-        for i in range(len(table)):
-            if table[i]['name'] == name and (table[i]['scope'] == 'global' or table[i]['scope'] == scope):
-                table[i]['init'] = 'Y'
-    else:
-        res = findall_by_attr(node, 'chamada_funcao')
-        if not res and not variableHasError(name, scope):
-            addVaribleError(name,scope)
-            print(error_handler.newError('ERR-SEM-VAR-NOT-DECL').format(name))
-
-def usedVariables(table, name, scope, node):
-    if variableIsDeclared(table=table, name=name, scope=scope):
-        for i in range(len(table)):
-            if table[i]['name'] == name and (table[i]['scope'] == 'global' or table[i]['scope'] == scope):
-                table[i]['used'] = 'Y'
-    else:
-        res = findall_by_attr(node, 'chamada_funcao')
-        if not res and not variableHasError(name, scope):
-            addVaribleError(name,scope)
-            print(error_handler.newError('ERR-SEM-VAR-NOT-DECL').format(name))
-
-def verifyVariables(table):
-    res = findall_by_attr(root, "acao")
-    for p in res:
-        renderNodeTree = [node for pre, fill, node in RenderTree(p)]
-        for node1 in renderNodeTree:
-            renderNode1Tree = [node for pre, fill, node in RenderTree(node1)]
-            if node1.name == 'expressao':
-                if renderNode1Tree[1].name == 'atribuicao':
-                    scope = getScope(node1)
-                    name = renderNode1Tree[4].name
-                    initVariables(table=table, name=name, scope=scope, node=node1)                    
+def checkCoercions(table, name, scope, factors):
+    type = getType(table, name, scope)
+    if type != None:
+        if len(factors) == 1:
+            type_factor = factors[0]['type']
+            if type_factor != type:
+                value_factor = factors[0]['value']
+                factor = factors[0]['factor']
+                if factor == 'var':
+                    report(error_handler.newError('WAR-SEM-ATR-DIFF-TYPES-IMP-COERC-OF-VAR').format(value_factor, type_factor, name, type))
+                elif factor == 'func':
+                    report(error_handler.newError('WAR-SEM-ATR-DIFF-TYPES-IMP-COERC-OF-RET-VAL').format(value_factor, type_factor, name, type))
                 else:
-                    for index in range(len(renderNode1Tree)):
-                        if renderNode1Tree[index].name == 'ID':
-                            scope = getScope(node1)
-                            name = renderNode1Tree[index+1].name
-                            usedVariables(table=table, name=name, scope=scope, node=node1)
-            elif node1.name == 'leia':
-                for index in range(len(renderNode1Tree)):
-                    if renderNode1Tree[index].name == 'ID':
-                        scope = getScope(node1)
-                        name = renderNode1Tree[index+1].name
-                        initVariables(table=table, name=name, scope=scope, node=node1)   
-            elif node1.name in ['se','repita','escreva','retorna']:
-                for index in range(len(renderNode1Tree)):
-                    if renderNode1Tree[index].name == 'ID':
-                        scope = getScope(node1)
-                        name = renderNode1Tree[index+1].name
-                        usedVariables(table=table, name=name, scope=scope, node=node1)
-            elif node1.name == 'chamada_funcao':
-                scope = getScope(node1)
-                name = node1.children[0].children[0].name
-                usedVariables(table=table, name=name, scope=scope, node=node1)
+                    report(error_handler.newError('WAR-SEM-ATR-DIFF-TYPES-IMP-COERC-OF-NUM').format(value_factor, type_factor, name, type))                        
+        else:
+            type_factor = getTypeFactors(factors, type)
+            if type_factor != type:
+                value_factor = 'expressao'
+                report(error_handler.newError('WAR-SEM-ATR-DIFF-TYPES-IMP-COERC-OF-EXP').format(value_factor, type_factor, name, type))
+
+def initVariables(table, name, scope, factors):
+    symbol = table.lookup(name, scope)
+    if symbol != None:
+        checkCoercions(table=table, name=name, scope=scope, factors=factors)
+        symbol.init = 'Y'
+    elif not variableHasError(name, scope):
+        addVaribleError(name,scope)
+        report(error_handler.newError('ERR-SEM-VAR-NOT-DECL').format(name))
+
+def usedVariables(table, name, scope):
+    symbol = table.lookup(name, scope)
+    if symbol != None:
+        symbol.used = 'Y'
+    elif not variableHasError(name, scope):
+        addVaribleError(name,scope)
+        report(error_handler.newError('ERR-SEM-VAR-NOT-DECL').format(name))
+
+class UsageVisitor(Visitor):
+    # Segunda travessia: marca as variáveis inicializadas e utilizadas nos
+    # comandos das funções, verifica as coerções das atribuições e guarda os
+    # retornos e as chamadas para as verificações de funções.
+
+    def __init__(self, table):
+        self.table = table
+        self.functions = []
+        self.calls = []
+        self.actions = 0
+        self.expressions = 0
+        self.conditionals = 0
+        self.statements = 0
+        self.reading = 0
+        self.target = None
+
+    def visit_cabecalho(self, node):
+        if node.children[0].name == 'ID':
+            self.functions.append((node.children[0].children[0].name, []))
+
+    def visit_acao(self, node):
+        self.actions += 1
+
+    def leave_acao(self, node):
+        self.actions -= 1
+
+    def visit_expressao(self, node):
+        self.expressions += 1
+        if self.actions and node.children[0].name == 'atribuicao':
+            var = node.children[0].children[0]
+            name = var.children[0].children[0].name
+            scope = getScope(node)
+            factors = getFactors(node, self.table, scope)
+            initVariables(table=self.table, name=name, scope=scope, factors=factors)
+            self.target = var
+
+    def leave_expressao(self, node):
+        self.expressions -= 1
+
+    def visit_var(self, node):
+        if not self.actions:
+            return
+        name = node.children[0].children[0].name
+        scope = getScope(node)
+        if node == self.target:
+            # Inicializada na atribuição; também é utilizada quando a
+            # atribuição está dentro de outro comando ou expressão.
+            if self.conditionals or self.statements or self.expressions > 1:
+                usedVariables(table=self.table, name=name, scope=scope)
+            return
+        if self.reading:
+            initVariables(table=self.table, name=name, scope=scope, factors=[])
+            if self.conditionals or self.expressions:
+                usedVariables(table=self.table, name=name, scope=scope)
+        elif self.conditionals or self.statements or self.expressions:
+            usedVariables(table=self.table, name=name, scope=scope)
+
+    def visit_se(self, node):
+        self.conditionals += 1
+
+    def leave_se(self, node):
+        self.conditionals -= 1
+
+    visit_repita = visit_se
+    leave_repita = leave_se
+
+    def visit_escreva(self, node):
+        self.statements += 1
+
+    def leave_escreva(self, node):
+        self.statements -= 1
+
+    def visit_retorna(self, node):
+        self.statements += 1
+        if self.functions and getScope(node) != 'global':
+            self.functions[-1][1].append(node)
+
+    leave_retorna = leave_escreva
+
+    def visit_leia(self, node):
+        self.reading += 1
+
+    def leave_leia(self, node):
+        self.reading -= 1
+
+    def visit_chamada_funcao(self, node):
+        self.calls.append(node)
+        if self.actions:
+            symbol = self.table.lookup(node.children[0].children[0].name, getScope(node))
+            if symbol != None:
+                symbol.used = 'Y'
 
 def verifyVariableIsUsed(table):
-    for i in range(len(table)):
-        name = table[i]['name']
-        scope = table[i]['scope']
-        if table[i]['declarationType'] == 'var' and table[i]['errors'] <= 0 and not variableHasError(name, scope):    
-            if table[i]['init'] == 'N' and table[i]['used'] == 'N':
-                print(error_handler.newError('WAR-SEM-VAR-DECL-NOT-USED').format(name))
-            elif table[i]['init'] == 'Y' and table[i]['used'] == 'N':
-                print(error_handler.newError('WAR-SEM-VAR-DECL-INIT-NOT-USED').format(name))
-            elif table[i]['init'] == 'N':
-                print(error_handler.newError('WAR-SEM-VAR-DECL-NOT-INIT').format(name))
-
-def verifyFunctionReturn(table):
-    res = findall_by_attr(root, 'declaracao_funcao')
-    for p in res:
-        renderNodeTree = [node for pre, fill, node in RenderTree(p)]
-        for node1 in renderNodeTree:
-            if node1.name == 'cabecalho':
-                renderNode1Tree = [node for pre, fill, node in RenderTree(node1)]
-                returns = findall_by_attr(node1, 'retorna')
-                funcName = renderNode1Tree[2].name
-                if not returns:                
-                    for i in range(len(table)):
-                        if table[i]['name'] == funcName and table[i]['declarationType'] == 'func' and table[i]['declarationType'] != 'vazio':
-                            print(error_handler.newError('ERR-SEM-FUNC-RET-TYPE-ERROR').format(funcName,table[i]['type'],'vazio'))
-                else:
-                    for return1 in returns:
-                        if return1.children:
-                            expression = return1.children[2]
-                            if expression.name == 'expressao':
-                                scope = getScope(return1)
-                                factors = getFactors(expression,table,scope)
-                                for i in range(len(table)):
-                                    if table[i]['name'] == funcName and table[i]['declarationType'] == 'func':
-                                        type = table[i]['type']
-                                        type_factor = getTypeFactors(factors, type)
-                                        if type_factor != type:
-                                            print(error_handler.newError('ERR-SEM-FUNC-RET-TYPE-ERROR').format(funcName,type,type_factor))
-
-def verifyCallFunctions(table):
-    res = findall_by_attr(root, 'chamada_funcao')
-    for p in res:
-        renderNodeTree = [node for pre, fill, node in RenderTree(p)]
-        name = renderNodeTree[2].name
+    for symbol in table:
+        name = symbol.name
+        scope = symbol.scope
+        if symbol.declarationType == 'var' and symbol.errors <= 0 and not variableHasError(name, scope):    
+            if symbol.init == 'N' and symbol.used == 'N':
+                report(error_handler.newError('WAR-SEM-VAR-DECL-NOT-USED').format(name))
+            elif symbol.init == 'Y' and symbol.used == 'N':
+                report(error_handler.newError('WAR-SEM-VAR-DECL-INIT-NOT-USED').format(name))
+            elif symbol.init == 'N':
+                report(error_handler.newError('WAR-SEM-VAR-DECL-NOT-INIT').format(name))
+
+def verifyFunctionReturn(functions, table):
+    for funcName, returns in functions:
+        function = table.function(funcName)
+        if not returns:                
+            if function != None:
+                report(error_handler.newError('ERR-SEM-FUNC-RET-TYPE-ERROR').format(funcName,function.type,'vazio'))
+        else:
+            for return1 in returns:
+                expression = return1.children[2]
+                if expression.name == 'expressao':
+                    factors = getFactors(expression,table,funcName)
+                    if function != None:
+                        type = function.type
+                        type_factor = getTypeFactors(factors, type)
+                        if type_factor != type:
+                            report(error_handler.newError('ERR-SEM-FUNC-RET-TYPE-ERROR').format(funcName,type,type_factor))
+
+def verifyCallFunctions(calls, table):
+    for p in calls:
+        name = p.children[0].children[0].name
         if variableIsDeclared(table=table, name=name, scope='global'):
             scopeCall = getScope(p)
             if name == 'principal':
                 if scopeCall == 'principal':
-                    print(error_handler.newError('WAR-SEM-CALL-REC-FUNC-MAIN').format(name))
-                print(error_handler.newError('ERR-SEM-CALL-FUNC-MAIN-NOT-ALLOWED'))
+                    report(error_handler.newError('WAR-SEM-CALL-REC-FUNC-MAIN').format(name))
+                report(error_handler.newError('ERR-SEM-CALL-FUNC-MAIN-NOT-ALLOWED'))
             else:
-                node1 = renderNodeTree[5]
+                node1 = p.children[2]
                 if node1.name == 'lista_argumentos':
                     if node1.children[0].name != 'vazio':
                         numberArguments = getCountParameters(node1)
-                        for i in range(len(table)):
-                            if table[i]['name'] == name and table[i]['declarationType'] == 'func':
-                                parameters = table[i]['parameters']
-                                if numberArguments < len(parameters):
-                                    print(error_handler.newError('ERR-SEM-CALL-FUNC-WITH-FEW-ARGS').format(name))
-                                elif numberArguments > len(parameters):
-                                    print(error_handler.newError('ERR-SEM-CALL-FUNC-WITH-MANY-ARGS').format(name))
+                        function = table.function(name)
+                        if function != None:
+                            parameters = function.parameters
+                            if numberArguments < len(parameters):
+                                report(error_handler.newError('ERR-SEM-CALL-FUNC-WITH-FEW-ARGS').format(name))
+                            elif numberArguments > len(parameters):
+                                report(error_handler.newError('ERR-SEM-CALL-FUNC-WITH-MANY-ARGS').format(name))
         else:
-            print(error_handler.newError('ERR-SEM-CALL-FUNC-NOT-DECL').format(name))            
+            report(error_handler.newError('ERR-SEM-CALL-FUNC-NOT-DECL').format(name))            
 
 def verifyFunctionsIsUsed(table):
-    for i in range(len(table)):
-        if table[i]['declarationType'] == 'func':
-            name = table[i]['name']
-            if table[i]['used'] == 'N':
-                print(error_handler.newError('WAR-SEM-FUNC-DECL-NOT-USED').format(name))
-
-def verifyFunctions(table):
-    verifyFunctionReturn(table)
-    verifyCallFunctions(table)
+    for symbol in table:
+        if symbol.declarationType == 'func':
+            name = symbol.name
+            if symbol.used == 'N':
+                report(error_handler.newError('WAR-SEM-FUNC-DECL-NOT-USED').format(name))
+
+def verifyFunctions(usage, table):
+    verifyFunctionReturn(usage.functions, table)
+    verifyCallFunctions(usage.calls, table)
     verifyFunctionsIsUsed(table)
 
-def checkRules():
-    table = symbolTable()
+def checkRules(tree=None):
+    # Duas travessias da árvore: declarações e depois comandos. As demais
+    # verificações usam a tabela e os nós guardados pela segunda travessia.
+    if tree is None:
+        tree = root
+    table = symbolTable(tree)
     if (not mainFunctionExists(table)):
-        print(error_handler.newError('ERR-SEM-MAIN-NOT-DECL'))
-    verifyVariables(table)
+        report(error_handler.newError('ERR-SEM-MAIN-NOT-DECL'))
+    usage = UsageVisitor(table)
+    usage.walk(tree)
     verifyVariableIsUsed(table)
-    verifyFunctions(table)
+    verifyFunctions(usage, table)
+    return table
 
 ## Poda da arvore
 
@@ -415,18 +575,22 @@ list_string = [
     'fecha_colchete'
 ]
 
+# As listas recursivas à esquerda (lista_*, corpo) são percorridas do último
+# item para o primeiro: os itens são acumulados em uma lista, invertida no
+# final, e os filhos do nó são atribuídos uma única vez.
+
 def pruneDeclaration(tree):
     item = tree.children[0]
-    dec = ()
+    dec = []
     while item.name == 'lista_declaracoes':
-        if item.name == 'lista_declaracoes':
-            if len(item.children) == 1:
-                node = item.children[0]
-            else:
-                node = item.children[1]
-            dec = node.children + dec
+        if len(item.children) == 1:
+            node = item.children[0]
+        else:
+            node = item.children[1]
+        dec.extend(reversed(node.children))
         item = item.children[0]
-    
+    dec.reverse()
+
     for i in dec:
         if i.name == 'declaracao_funcao':
             pruneFunctionDeclaration(i)
@@ -449,16 +613,16 @@ def pruneFunctionDeclaration(tree):
                 dec += (pruneBody(child),)
             elif child.name == 'lista_parametros':
                 item = child
-                dec1 = ()
+                dec1 = []
                 while item.name == 'lista_parametros':
                     if item.children[0].name == 'vazio':
-                        aux = item.children[0]
-                        dec1 = (aux,) + dec1
+                        dec1.append(item.children[0])
                     elif len(item.children) == 1:
-                        dec1 = (pruneParameter(item.children[0]),) + dec1
+                        dec1.append(pruneParameter(item.children[0]))
                     else:
-                        dec1 = (pruneParameter(item.children[2]),) + dec1
+                        dec1.append(pruneParameter(item.children[2]))
                     item = item.children[0]
+                dec1.reverse()
                 child.children = dec1
                 dec += (child,)
             else:
@@ -471,15 +635,15 @@ def pruneVaribleDeclaration(tree):
     dec += tree.children[1].children
 
     # Lista de Variaveis
-    dec1 = ()
+    dec1 = []
     item = tree.children[2]
     while item.name == 'lista_variaveis':
-        if item.name == 'lista_variaveis':
-            if len(item.children) == 1:
-                dec1 = (pruneVariable(item.children[0]),) + dec1
-            else:
-                dec1 = (pruneVariable(item.children[2]),) + dec1
+        if len(item.children) == 1:
+            dec1.append(pruneVariable(item.children[0]))
+        else:
+            dec1.append(pruneVariable(item.children[2]))
         item = item.children[0]
+    dec1.reverse()
     tree.children[2].children = dec1
     dec += (tree.children[2],)
     tree.children = dec
@@ -528,36 +692,47 @@ def pruneVariable(tree):
     return tree
 
 def pruneExpression(tree):
-    aux = tree.children
-    name = tree.name
-    while len(aux) == 1 and name != 'expressao_unaria':
-        name = aux[0].name
-        aux = aux[0].children
-    
-    dec = ()
-    if aux[0].parent.name == 'expressao_unaria':
-        if len(aux) == 1:
-            if aux[0].children[0].name == 'chamada_funcao':
-                dec += (pruneCallFunction(aux[0].children[0]),)
-            elif aux[0].children[0].name == 'var':
-                dec += (pruneVariable(aux[0].children[0]),)
-            elif aux[0].children[0].name == 'numero':
-                dec += aux[0].children[0].children
+    # A expressão vira a sequência infixa dos operandos, operadores e
+    # parênteses. A pilha guarda (nó, expandir): nós a expandir e folhas já
+    # prontas, na ordem inversa da saída; assim expressões longas (a + b + ...)
+    # não dependem do limite de recursão.
+    dec = []
+    stack = [(tree, True)]
+    while stack:
+        node, expand = stack.pop()
+        if not expand:
+            dec.append(node)
+            continue
+
+        aux = node.children
+        name = node.name
+        while len(aux) == 1 and name != 'expressao_unaria':
+            name = aux[0].name
+            aux = aux[0].children
+
+        if aux[0].parent.name == 'expressao_unaria':
+            if len(aux) > 1:
+                # operador fator
+                dec.extend(aux[0].children[0].children)
+            fator = aux[-1].children
+            if fator[0].name == 'chamada_funcao':
+                dec.append(pruneCallFunction(fator[0]))
+            elif fator[0].name == 'var':
+                dec.append(pruneVariable(fator[0]))
+            elif fator[0].name == 'numero':
+                dec.extend(fator[0].children)
             else:
-                dec += aux[0].children[0].children
-                dec += pruneExpression(aux[0].children[1])
-                dec += aux[0].children[2].children
+                # ( expressao )
+                dec.extend(fator[0].children)
+                stack.extend((leaf, False) for leaf in reversed(fator[2].children))
+                stack.append((fator[1], True))
         else:
-            dec += aux[0].children[0].children
-            dec += aux[1].children[0].children
-        aux = dec
-    else:
-       dec += pruneExpression(aux[0])
-       dec += (aux[1].children[0].children[0],)
-       dec += pruneExpression(aux[2])
-       aux = dec
-    
-    return aux
+            # operando operador operando
+            stack.append((aux[2], True))
+            stack.append((aux[1].children[0].children[0], False))
+            stack.append((aux[0], True))
+
+    return tuple(dec)
 
 def pruneCallFunction(tree):
     dec = ()
@@ -570,20 +745,19 @@ def pruneCallFunction(tree):
                 dec += child.children
             elif child.name == 'lista_argumentos':
                 item = child
-                dec1 = ()
+                dec1 = []
                 while item.name == 'lista_argumentos':
                     if item.children[0].name == 'vazio':
                         aux = item.children[0]
-                        dec1 = (aux,) + dec1
                     elif len(item.children) == 1:
                         aux = item.children[0]
                         aux.children = pruneExpression(item.children[0])
-                        dec1 = (aux,) + dec1
                     else:
                         aux = item.children[2]
                         aux.children = pruneExpression(item.children[2])
-                        dec1 = (aux,) + dec1
+                    dec1.append(aux)
                     item = item.children[0]
+                dec1.reverse()
                 child.children = dec1
                 dec += (child,)
             else:
@@ -592,17 +766,18 @@ def pruneCallFunction(tree):
     return tree
 
 def pruneParameter(tree):
-    dec = ()
+    # Partes em ordem inversa: ([ ]) ... (tipo : id).
+    parts = []
     item = tree
     while item.name == 'parametro':
-        if item.children[0].name == 'parametro':
-            dec = item.children[2].children + dec
-            dec = item.children[1].children + dec
-        else:
-            dec = item.children[2].children + dec
-            dec = item.children[1].children + dec
-            dec = item.children[0].children[0].children + dec
+        parts.append(item.children[2].children)
+        parts.append(item.children[1].children)
+        if item.children[0].name != 'parametro':
+            parts.append(item.children[0].children[0].children)
         item = item.children[0]
+    dec = []
+    for part in reversed(parts):
+        dec.extend(part)
     tree.children = dec
     return tree
 
@@ -647,33 +822,35 @@ def pruneRepeat(tree):
     return tree
 
 def pruneBody(tree):
-    dec = ()
+    dec = []
     item = tree
     while item.name == 'corpo':
         if len(item.children) == 2:
             action = item.children[1].children[0]
             if action.name == 'expressao':
                 if action.children[0].name == 'atribuicao':
-                    dec = (pruneAssignment(action.children[0]),) + dec
+                    dec.append(pruneAssignment(action.children[0]))
                 else:
                     action.children = pruneExpression(action)
-                    dec = (action,) + dec
+                    dec.append(action)
             elif action.name == 'declaracao_variaveis':
-                dec = (pruneVaribleDeclaration(action),) + dec
+                dec.append(pruneVaribleDeclaration(action))
             elif action.name == 'se':
-                dec = (pruneIf(action),) + dec
+                dec.append(pruneIf(action))
             elif action.name == 'repita':
-                dec = (pruneRepeat(action),) + dec
+                dec.append(pruneRepeat(action))
             else:
-                dec = (pruneSpecialFunctions(action),) + dec
+                dec.append(pruneSpecialFunctions(action))
         item = item.children[0]
+    dec.reverse()
     tree.children = dec
     return tree
 
-def pruneTree():
-    tree = root
+def pruneTree(tree=None, emit_ast='none'):
+    if tree is None:
+        tree = root
     pruneDeclaration(tree)
-    UniqueDotExporter(tree).to_picture("prunedTree.png")
+    mytree.exports.append(mytree.exportTree(tree, "prunedTree", emit_ast))
 
 def main():
     if(len(sys.argv) < 2):
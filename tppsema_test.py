@@ -85,3 +85,96 @@ def test_019():
 
 def test_020():
     assert execute_test("sema-020.tpp") == True
+
+
+def check_source(source):
+    import tppparser, tppsema
+    from myerror import diagnostics
+    errors = []
+    token = diagnostics.set(errors)
+    try:
+        tree = tppparser.parse(source)
+        tppsema.reset(tree)
+        table = tppsema.checkRules(tree)
+    finally:
+        diagnostics.reset(token)
+    return table, errors
+
+def test_021():
+    # Escopo local, parâmetros da própria função e escopo global.
+    table, errors = check_source(
+        'inteiro: g\n'
+        'inteiro f(flutuante: x)\n  inteiro: a, b\n  a := x\n  b := a + g\n  retorna(b)\nfim\n'
+        'inteiro principal()\n  g := f(1.0)\n  retorna(0)\nfim\n')
+    assert table.lookup('a', 'f').scope == 'f'
+    assert table.lookup('b', 'f').scope == 'f'
+    assert table.lookup('x', 'f').type == 'flutuante'
+    assert table.lookup('x', 'principal') is None
+    assert table.lookup('g', 'principal') is table.lookup('g')
+    assert table.function('f').parameters[0].name == 'x'
+    assert [symbol.name for symbol in table] == ['g', 'f', 'a', 'b', 'principal']
+
+def test_022():
+    # Parâmetros de uma função não são visíveis nas outras.
+    table, errors = check_source(
+        'inteiro f(inteiro: n)\n  retorna(n)\nfim\n'
+        'inteiro principal()\n  n := 1\n  retorna(f(n))\nfim\n')
+    assert errors == ["Error: Variável 'n' não declarada."]
+
+def test_023():
+    # Avisos de comandos dentro de se/repita são mostrados uma única vez.
+    table, errors = check_source(
+        'flutuante: v[10]\n'
+        'inteiro principal()\n  inteiro: i\n  i := 0\n'
+        '  repita\n    se i > 1 então\n      v[i] := 1\n    fim\n    i := i + 1\n  até i = 10\n'
+        '  escreva(v[0])\n  retorna(0)\nfim\n')
+    assert errors == ["Aviso: Atribuição de tipos distintos. Coerção implícita do valor atribuído '1' do tipo 'inteiro' para 'v' que é 'flutuante'."]
+
+def test_024():
+    # Corpos longos (árvores profundas) são analisados sem recursão.
+    body = '  i := i + 1\n' * 5000
+    table, errors = check_source('inteiro principal()\n  inteiro: i\n  i := 0\n' + body + '  retorna(i)\nfim\n')
+    assert errors == []
+    assert table.lookup('i', 'principal').used == 'Y'
+
+def test_025():
+    # As anotações de annotate() respondem o mesmo que a busca nos ancestrais.
+    import tppparser, tppsema
+    from anytree import PreOrderIter
+    tree = tppparser.parse(
+        'inteiro: v[10]\n'
+        'inteiro f(inteiro: a)\n  v[a] := a\n  retorna(v[f(a - 1)])\nfim\n'
+        'inteiro principal()\n  escreva(f(v[1]))\n  retorna(0)\nfim\n')
+    nodes = [node for node in PreOrderIter(tree) if node.children]
+    expected = [(tppsema.getScope(node), tppsema.valueIsIndex(node), tppsema.valueIsArgument(node)) for node in nodes]
+    tppsema.annotate(tree)
+    assert [(node.scope, node.inIndex, node.inArgument) for node in nodes] == expected
+    assert set(expected) >= {('f', True, True), ('principal', False, True), ('global', True, False)}
+
+def test_026():
+    # A poda mantém a ordem das declarações, comandos, parâmetros e argumentos.
+    import tppparser, tppsema
+    body = ''.join('  escreva(%d)\n' % k for k in range(3000))
+    tree = tppparser.parse(
+        'inteiro: a, b, c\n'
+        'inteiro f(inteiro: x, flutuante: y[][], inteiro: z)\n  retorna(x)\nfim\n'
+        'inteiro principal()\n  a := f(1, 2, 3)\n' + body + '  retorna(0)\nfim\n')
+    tppsema.pruneDeclaration(tree)
+    declarations = tree.children[0].children
+    assert [var.children[0].name for var in declarations[0].children[2].children] == ['a', 'b', 'c']
+    parameters = declarations[1].children[3].children
+    assert [node.name for node in parameters[1].children] == ['flutuante', ':', 'y', '[', ']', '[', ']']
+    assert [param.children[2].name for param in parameters] == ['x', 'y', 'z']
+    actions = declarations[2].children[5].children
+    arguments = actions[0].children[2].children[0].children[2].children
+    assert [arg.children[0].children[0].name for arg in arguments] == ['1', '2', '3']
+    assert [action.children[2].children[0].children[0].name for action in actions[1:-1]] == [str(k) for k in range(3000)]
+
+def test_027():
+    # Cada variável não declarada é reportada uma única vez por escopo.
+    names = ['x%d' % k for k in range(300)]
+    body = ''.join('  %s := %s + 1\n' % (name, name) for name in names) * 2
+    table, errors = check_source('inteiro principal()\n' + body + '  retorna(0)\nfim\n'
+                                 'inteiro f()\n  x0 := 1\n  retorna(0)\nfim\n')
+    assert errors[:-1] == ["Error: Variável '%s' não declarada." % name for name in names + ['x0']]
+    assert errors[-1] == "Aviso: Função 'f' declarada, mas não utilizada."
@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+import concurrent.futures
+
+import tpplex
+import tppcache
+import tppparser
+from tppcompiler import Compilation, Cancelled
+
+# Servidor de compilação: um processo que mantém o lexer, as tabelas do
+# parser e a target machine do LLVM carregados e atende requisições em um
+# socket Unix, sem o custo de inicialização de cada `python main.py`.
+#
+# Protocolo: uma requisição JSON por linha e uma resposta JSON por linha,
+# na mesma conexão. A requisição de compilação tem 'path' (arquivo .tpp) ou
+# 'source' (código), as opções da Compilation (emit_ast, flat, direct,
+# lexer, cache, incremental, opt), 'check', 'output' (arquivo .ll a gravar)
+# e 'object' (arquivo .o a gravar). A resposta tem status, ir, diagnostics
+# (mensagens), output, object e elapsed.
+# 'op' pode ser também 'ping' ou 'shutdown'; 'id' é devolvido na resposta.
+#
+# As compilações executam em threads (Compilation não compartilha estado),
+# e cada conexão é atendida pelo laço do asyncio. Uma compilação que passa
+# de timeout segundos é cancelada (Compilation.cancel) e a resposta é de
+# erro; as mensagens de cada compilação são limitadas por
+# myerror.MAX_DIAGNOSTICS. O arquivo lido ('path', que também nomeia as
+# exportações de emit_ast) e os arquivos 'output' e 'object' precisam estar
+# dentro do diretório root do servidor.
+#
+# Uso: python tppserver.py [--socket caminho] [--workers n] [--timeout s] [--root dir] [--stop]
+
+COMPILE_OPTIONS = ('emit_ast', 'flat', 'direct', 'lexer', 'cache', 'incremental', 'opt')
+LINE_LIMIT = 1 << 28
+TIMEOUT = 60
+
+
+def socket_path():
+    # $TPP_SERVER_SOCKET ou server/tpp.sock na cache.
+    return os.environ.get('TPP_SERVER_SOCKET') or os.path.join(tppcache.cache_dir('server'), 'tpp.sock')
+
+
+def warm_up():
+    from tppgencode import getTargetMachine
+    tpplex.get_lexer()
+    tppparser.get_parser()
+    getTargetMachine()
+
+
+def inside(path, root):
+    root = os.path.realpath(root)
+    return os.path.commonpath([os.path.realpath(path), root]) == root
+
+
+def compile_request(request, root=None, started=None, cancelled=None):
+    # Executa uma requisição de compilação e monta a resposta. Com root, o
+    # arquivo de entrada e os de saída precisam estar dentro de root; started recebe a
+    # Compilation antes de ela executar. cancelled (threading.Event) é
+    # consultado antes de ler o arquivo e antes de executar a Compilation.
+    start = time.perf_counter()
+    options = {name: request[name] for name in COMPILE_OPTIONS if name in request}
+    compilation = None
+    code = None
+    output = None
+    obj = None
+    try:
+        for name in ('path', 'output', 'object'):
+            if root and request.get(name) and not inside(request[name], root):
+                raise PermissionError('%s fora de %s: %s' % (name, root, request[name]))
+        if cancelled is not None and cancelled.is_set():
+            raise Cancelled(request.get('path') or '')
+        if 'source' in request:
+            compilation = Compilation(request['source'], request.get('path'), **options)
+        else:
+            compilation = Compilation.from_file(request['path'], **options)
+        if started:
+            started(compilation)
+        if cancelled is not None and cancelled.is_set():
+            compilation.cancel()
+        code = compilation.run(check=request.get('check', False))
+        status = 'ok' if code != None else 'erro: IR inválido' if compilation.hasTree() else 'sem árvore'
+        if code != None and request.get('output'):
+            output = request['output']
+            file = open(output, 'w')
+            file.write(code)
+            file.close()
+        if code != None and request.get('object'):
+            from tppgencode import emitObject
+            with compilation.active():
+                if emitObject(code, request['object'], request.get('opt', 0)):
+                    obj = request['object']
+                else:
+                    status = 'erro: IR inválido'
+    except Exception as e:
+        status = 'erro: %s' % e
+    return {
+        'path': request.get('path'),
+        'status': status,
+        'ir': code,
+        'diagnostics': compilation.errors if compilation else [],
+        'output': output,
+        'object': obj,
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+class Server():
+
+    def __init__(self, path=None, workers=None, timeout=TIMEOUT, root=None):
+        self.path = path or socket_path()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.timeout = timeout
+        self.root = root or os.getcwd()
+        self.stopping = None
+
+    async def compile(self, request):
+        loop = asyncio.get_running_loop()
+        compilations = []
+        cancelled = threading.Event()
+        task = loop.run_in_executor(self.executor, compile_request, request, self.root, compilations.append,
+                                    cancelled)
+        try:
+            return await asyncio.wait_for(task, self.timeout)
+        except asyncio.TimeoutError:
+            # A thread continua até a compilação ver o cancelamento. Antes de a
+            # Compilation existir (leitura do arquivo), o evento a cancela logo
+            # que ela é criada.
+            cancelled.set()
+            for compilation in compilations:
+                compilation.cancel()
+            return {'path': request.get('path'), 'status': 'erro: tempo esgotado (%g s)' % self.timeout,
+                    'ir': None, 'diagnostics': [], 'output': None, 'object': None, 'elapsed': self.timeout}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    op = request.get('op', 'compile')
+                except (ValueError, AttributeError):
+                    request = {}
+                    op = None
+                if op == 'compile':
+                    response = await self.compile(request)
+                elif op == 'ping':
+                    response = {'status': 'ok', 'pid': os.getpid()}
+                elif op == 'shutdown':
+                    response = {'status': 'ok'}
+                    self.stopping.set()
+                else:
+                    response = {'status': 'erro: requisição inválida'}
+                if 'id' in request:
+                    response['id'] = request['id']
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # Cliente desconectado, ou linha maior que LINE_LIMIT.
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, ready=None):
+        # ready (threading.Event) é sinalizado quando o socket está aceitando
+        # conexões.
+        if running(self.path):
+            raise OSError('servidor já em execução em %s' % self.path)
+        warm_up()
+        self.stopping = asyncio.Event()
+        server = await asyncio.start_unix_server(self.handle, self.path, limit=LINE_LIMIT)
+        try:
+            if ready:
+                ready.set()
+            async with server:
+                await self.stopping.wait()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.executor.shutdown(wait=False)
+
+    def run(self, ready=None):
+        asyncio.run(self.serve(ready))
+
+
+def remote(request, path=None):
+    # Envia uma requisição ao servidor e retorna a resposta. OSError se o
+    # servidor não está em execução.
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path or socket_path())
+        client.sendall(json.dumps(request).encode() + b'\n')
+        with client.makefile('rb') as stream:
+            line = stream.readline()
+    if not line:
+        raise ConnectionError('o servidor fechou a conexão')
+    return json.loads(line)
+
+
+def running(path=None):
+    try:
+        return remote({'op': 'ping'}, path)['status'] == 'ok'
+    except OSError:
+        return False
+
+
+def submit(request, path=None):
+    # Compila no servidor ou, se ele não está em execução, no próprio
+    # processo; a resposta é a mesma nos dois casos.
+    try:
+        return remote(request, path)
+    except OSError:
+        return compile_request(request)
+
+
+def positive(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('deve ser maior que zero: %s' % value)
+    return number
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Servidor de compilação TPP.')
+    arg_parser.add_argument('--socket', help='socket Unix (padrão: $TPP_SERVER_SOCKET ou a cache)')
+    arg_parser.add_argument('--workers', type=positive, help='número de compilações simultâneas')
+    arg_parser.add_argument('--timeout', type=float, default=TIMEOUT,
+                            help='tempo máximo de uma compilação, em segundos (padrão: %(default)s)')
+    arg_parser.add_argument('--root', help='diretório em que o servidor pode ler e gravar (padrão: o diretório corrente)')
+    arg_parser.add_argument('--stop', action='store_true', help='encerra o servidor em execução')
+    args = arg_parser.parse_args()
+
+    if args.stop:
+        try:
+            remote({'op': 'shutdown'}, args.socket)
+        except OSError:
+            sys.exit('servidor não está em execução')
+        return
+    Server(args.socket, args.workers, args.timeout, args.root).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import os
+import time
+import shutil
+import threading
+import concurrent.futures
+import tppserver
+
+files = ['tests/gencode-001.tpp', 'tests/gencode-010.tpp', 'tests/gencode-012.tpp', 'tests/gencode-014.tpp']
+
+def copy(root):
+    # O servidor só lê arquivos dentro do seu diretório root.
+    names = []
+    for name in files:
+        names.append(str(root / os.path.basename(name)))
+        shutil.copy(name, names[-1])
+    return names
+
+def start(server):
+    ready = threading.Event()
+    thread = threading.Thread(target=server.run, args=(ready,))
+    thread.start()
+    assert ready.wait(30)
+    return thread
+
+def stop(server, thread):
+    tppserver.remote({'op': 'shutdown'}, server.path)
+    thread.join(30)
+
+def result(response):
+    return response['status'], response['ir'], response['diagnostics']
+
+def test_001(tmp_path):
+    # Requisições simultâneas ao servidor: mesmas respostas da compilação
+    # no próprio processo.
+    path = str(tmp_path / 'tpp.sock')
+    server = tppserver.Server(path, workers=4, root=str(tmp_path))
+    thread = start(server)
+    try:
+        assert tppserver.running(path)
+        requests = [{'path': name, 'id': i} for i, name in enumerate(copy(tmp_path) * 4)]
+        requests.append({'source': 'inteiro principal()\n  retorna(0)\nfim\n', 'output': str(tmp_path / 'a.ll')})
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(lambda request: tppserver.remote(request, path), requests))
+        for request, response in zip(requests, responses):
+            assert response.get('id') == request.get('id')
+            assert result(response) == result(tppserver.compile_request(request))
+        assert open(responses[-1]['output']).read() == responses[-1]['ir']
+        assert tppserver.remote({'op': 'x'}, path)['status'].startswith('erro')
+    finally:
+        stop(server, thread)
+    assert not os.path.exists(path)
+
+def test_002(tmp_path):
+    # Sem servidor, o cliente compila no próprio processo.
+    path = str(tmp_path / 'tpp.sock')
+    assert not tppserver.running(path)
+    request = {'path': files[0]}
+    assert result(tppserver.submit(request, path)) == result(tppserver.compile_request(request))
+
+def test_003(tmp_path, monkeypatch):
+    # Compilação que passa do tempo limite: resposta de erro, e a thread é
+    # liberada pelo cancelamento.
+    import myerror
+    import tppcompiler
+    def parse(compilation):
+        while True:
+            compilation.checkCancelled()
+            time.sleep(0.01)
+    server = tppserver.Server(str(tmp_path / 'tpp.sock'), workers=1, timeout=0.2, root=str(tmp_path))
+    name = copy(tmp_path)[0]
+    thread = start(server)
+    try:
+        with monkeypatch.context() as patch:
+            patch.setattr(tppcompiler.Compilation, 'parse', parse)
+            response = tppserver.remote({'path': name}, server.path)
+        assert response['status'].startswith('erro: tempo esgotado')
+        assert tppserver.remote({'path': name}, server.path)['status'] == 'ok'
+        # Mensagens limitadas.
+        monkeypatch.setattr(myerror, 'MAX_DIAGNOSTICS', 10)
+        response = tppserver.remote({'source': 'inteiro principal()\n' + '  x := * 1\n' * 20 + 'fim\n'}, server.path)
+        assert response['status'].startswith('erro') and len(response['diagnostics']) == 10
+        # Arquivos de saída só dentro do diretório do servidor.
+        outside = str(tmp_path.parent / 'fora.ll')
+        response = tppserver.remote({'path': name, 'output': outside}, server.path)
+        assert response['status'].startswith('erro') and not os.path.exists(outside)
+        # Entrada e exportações da árvore também.
+        response = tppserver.remote({'path': files[0]}, server.path)
+        assert response['status'].startswith('erro') and response['ir'] == None
+        evil = str(tmp_path.parent / 'fora')
+        response = tppserver.remote({'source': 'inteiro principal()\n  retorna(0)\nfim\n', 'path': evil, 'emit_ast': 'dot'}, server.path)
+        assert response['status'].startswith('erro') and not os.path.exists(evil + '.ast.dot')
+        response = tppserver.remote({'path': name, 'object': str(tmp_path / 'a.o')}, server.path)
+        assert response['status'] == 'ok' and os.path.exists(response['object'])
+    finally:
+        stop(server, thread)
+
+def test_004(tmp_path, monkeypatch):
+    # Tempo esgotado antes de a Compilation existir (leitura do arquivo): a
+    # compilação não executa e o worker é liberado.
+    import tppcompiler
+    runs = []
+    from_file = tppcompiler.Compilation.from_file.__func__
+    run = tppcompiler.Compilation.run
+    def slow(cls, *args, **kwargs):
+        time.sleep(0.5)
+        return from_file(cls, *args, **kwargs)
+    def counted(compilation, *args, **kwargs):
+        runs.append(compilation)
+        return run(compilation, *args, **kwargs)
+    server = tppserver.Server(str(tmp_path / 'tpp.sock'), workers=1, timeout=0.2, root=str(tmp_path))
+    name = copy(tmp_path)[0]
+    thread = start(server)
+    try:
+        with monkeypatch.context() as patch:
+            patch.setattr(tppcompiler.Compilation, 'from_file', classmethod(slow))
+            patch.setattr(tppcompiler.Compilation, 'run', counted)
+            response = tppserver.remote({'path': name}, server.path)
+            assert response['status'].startswith('erro: tempo esgotado')
+            time.sleep(0.5)
+            assert tppserver.remote({'source': 'inteiro principal()\n  retorna(0)\nfim\n'}, server.path)['status'] == 'ok'
+            # A primeira Compilation foi cancelada antes de executar.
+            assert runs[0].cancelled and runs[0].root == None
+    finally:
+        stop(server, thread)